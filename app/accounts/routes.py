@@ -1,22 +1,52 @@
 import uuid
 from datetime import datetime
-from typing import List
-
-import cloudinary
-import cloudinary.uploader
-from cloudinary.utils import cloudinary_url
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from typing import List, Literal, Optional
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from app.core.auth import AuthHandler
 from app.core._id import PyObjectId
+from app.core.conditional import (
+    VERSION_FIELDS,
+    check_not_modified,
+    document_etag,
+    is_conditional,
+    set_validators,
+)
 from app.core.database import get_database
-from app.core.helpers import transform_mongo_data
+from app.core.fieldsets import (
+    allowed_fields,
+    parse_fields,
+    select_fields,
+    to_projection,
+)
+from app.core.helpers import order_by_ids, parse_object_ids, transform_mongo_data
+from app.core.http_client import HttpClient, get_http_client
 from app.core.pagination import paginate
+from app.core.serialization import json_response, paginated_json_response
+from app.core.uploads import upload_image
+from app.core.writebehind import telemetry
+from app.core.writes import insert_document, update_document, versioned
 from app.accounts.permissions import hasAdminPermission
 from app.accounts.schemas import (
     MFARequest,
+    TokenRefreshSchema,
+    UserBatchRequestSchema,
+    UserBatchResponseSchema,
     UserLoginResponseSchema,
     UserLoginSchema,
     UserRegisterSchema,
@@ -24,11 +54,17 @@ from app.accounts.schemas import (
     UserUpdateRoleSchema,
     UserInfoResponseSchema,
     UserInfoPaginatedResponseSchema,
+    UserBatchResponseAdapter,
+    UserInfoListAdapter,
 )
 from app.accounts.services import (
+    MFA_QRCODE_MEDIA_TYPES,
     disable_user_mfa,
     get_current_user,
     generate_mfa_qrcode,
+    issue_refresh_token,
+    mfa_qrcode_image,
+    rotate_refresh_token,
     verify_2fa_otp,
 )
 
@@ -39,6 +75,8 @@ router = APIRouter(
     tags=["Authentication"],
 )
 
+USER_LIST_FIELDS = allowed_fields(UserInfoResponseSchema)
+
 
 @router.post(
     "/login",
@@ -49,9 +87,6 @@ async def login(
     user: UserLoginSchema, db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     existing_user = await db["users"].find_one({"email": user.email})
-    last_login_data = {"last_login": datetime.now()}
-    await db["users"].update_one({"email": user.email}, {"$set": last_login_data})
-
     if not existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="User not found"
@@ -62,14 +97,22 @@ async def login(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid credentials"
         )
 
+    telemetry.record("users", existing_user["_id"], {"last_login": datetime.now()})
     return {
         "id": str(existing_user["_id"]),
         "email": existing_user["email"],
         "access_token": auth_handler.encode_token(user.email),
-        "refresh_token": auth_handler.encode_refresh_token(user.email),
+        "refresh_token": issue_refresh_token(existing_user),
     }
 
 
+@router.post("/refresh", response_model=UserLoginResponseSchema)
+async def refresh_token(
+    payload: TokenRefreshSchema, db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    return await rotate_refresh_token(db, payload.refresh_token)
+
+
 @router.post(
     "/register",
     response_model=UserLoginResponseSchema,
@@ -78,33 +121,67 @@ async def login(
 async def create_user(
     user: UserRegisterSchema, db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    existing_user = await db["users"].find_one({"email": user.email})
-    if existing_user:
+    # Checked before hashing so a duplicate signup doesn't cost a bcrypt
+    # round; the unique email index still settles concurrent signups.
+    if await db["users"].find_one({"email": user.email}, {"_id": 1}):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
 
     user_dict = user.model_dump()
     user_dict["password"] = auth_handler.get_password_hash(user.password)
-    user_dict["created_at"] = user_dict["updated_at"] = datetime.now()
-    res = await db["users"].insert_one(user_dict)
-    new_user = await db["users"].find_one({"_id": res.inserted_id})
+    try:
+        new_user = await insert_document(db["users"], versioned(user_dict))
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
+        )
 
     return {
         "id": str(new_user["_id"]),
         "email": new_user["email"],
         "access_token": auth_handler.encode_token(new_user["email"]),
-        "refresh_token": auth_handler.encode_refresh_token(new_user["email"]),
+        "refresh_token": issue_refresh_token(new_user),
     }
 
 
+# Declared before "/{id}" so the path isn't taken for a user ID.
+@router.get("/mfa_qrcode")
+async def get_mfa_qrcode(
+    format: Literal["png", "svg"] = "png",
+    current_user=Depends(auth_handler.auth_wrapper),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """The MFA setup QR code as an image, instead of a base64 data URI."""
+    user = await db["users"].find_one(
+        {"email": current_user}, {"email": 1, "mfa_secret": 1}
+    )
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not user.get("mfa_secret"):
+        raise HTTPException(status_code=404, detail="MFA has not been set up.")
+
+    image = await mfa_qrcode_image(user, format)
+    return Response(
+        image,
+        media_type=MFA_QRCODE_MEDIA_TYPES[format],
+        # The image encodes the MFA secret.
+        headers={"Cache-Control": "no-store"},
+    )
+
+
 @router.get("/{id}", response_model=UserInfoResponseSchema)
 async def get_user(
     id: str,
+    request: Request,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_user=Depends(auth_handler.auth_wrapper),
 ):
-    user = await db["users"].find_one({"_id": PyObjectId(id)})
+    # A conditional request only needs what the permission check and the
+    # validators use; the full document is loaded when it has changed.
+    projection = {"email": 1, **VERSION_FIELDS} if is_conditional(request) else None
+    user = await db["users"].find_one({"_id": PyObjectId(id)}, projection)
     req_user = await get_current_user(current_user, db)
 
     if not user:
@@ -118,15 +195,50 @@ async def get_user(
     ):
         raise HTTPException(status_code=ERROR_CODE, detail="Not allowed, contact admin")
 
+    if projection:
+        etag = document_etag(user)
+        cached = check_not_modified(request, etag, user.get("updated_at"))
+        if cached:
+            return cached
+        user = await db["users"].find_one({"_id": PyObjectId(id)})
+
+    set_validators(response, document_etag(user), user.get("updated_at"))
     user = transform_mongo_data(user)
     return user
 
 
+@router.post("/batch", response_model=UserBatchResponseSchema)
+async def get_users_batch(
+    payload: UserBatchRequestSchema,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user=Depends(auth_handler.auth_wrapper),
+):
+    req_user = await get_current_user(current_user, db)
+    object_ids, invalid = parse_object_ids(payload.ids)
+    users = await db["users"].find({"_id": {"$in": object_ids}}).to_list(length=None)
+    users, missing = order_by_ids(users, object_ids)
+
+    # Same rule as get_user, applied per item: admins see everyone, other
+    # users only themselves.
+    items, forbidden = [], []
+    for user in users:
+        if hasAdminPermission(req_user) or req_user.get("email") == user["email"]:
+            items.append(user)
+        else:
+            forbidden.append(str(user["_id"]))
+
+    return json_response(
+        UserBatchResponseAdapter,
+        {"items": items, "missing": invalid + missing, "forbidden": forbidden},
+    )
+
+
 @router.get(
     "",
     response_model=UserInfoPaginatedResponseSchema,
 )
 async def admin_get_users(
+    fields: Optional[str] = Query(None, description="Comma-separated fields"),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     db: AsyncIOMotorDatabase = Depends(get_database),
@@ -137,11 +249,18 @@ async def admin_get_users(
         msg = "Only admins are allowed to perform this action."
         raise HTTPException(status_code=400, detail=msg)
 
-    users = await db["users"].find().to_list(length=None)
-    paginated_response = paginate(
-        transform_mongo_data(users), page=page, page_size=page_size
+    fields = parse_fields(fields, USER_LIST_FIELDS)
+    users = await db["users"].find({}, to_projection(fields)).to_list(length=None)
+    paginated_response = paginate(users, page=page, page_size=page_size)
+    if fields is None:
+        return paginated_json_response(UserInfoListAdapter, paginated_response)
+
+    # A trimmed item no longer satisfies UserInfoResponseSchema, so bypass the
+    # response model; only fields from that schema can have been selected.
+    paginated_response["items"] = select_fields(
+        transform_mongo_data(paginated_response["items"]), fields
     )
-    return paginated_response
+    return JSONResponse(jsonable_encoder(paginated_response))
 
 
 @router.patch("/{id}/role", response_model=UserInfoResponseSchema)
@@ -152,42 +271,34 @@ async def update_user_role(
     current_user=Depends(auth_handler.auth_wrapper),
 ):
     req_user = await get_current_user(current_user, db)
-    user = await db["users"].find_one({"_id": PyObjectId(id)})
+    if not req_user.get("role") or not req_user.get("role") == "admin":
+        raise HTTPException(status_code=ERROR_CODE, detail="Not allowed, contact admin")
 
-    if not user:
+    payload = payload.model_dump(exclude_unset=True)
+    payload["last_updated_by"] = str(req_user["_id"])
+    updated_user = await update_document(
+        db["users"], {"_id": PyObjectId(id)}, {"$set": payload}
+    )
+    if not updated_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-
-    if not req_user.get("role") or not req_user.get("role") == "admin":
-        raise HTTPException(status_code=ERROR_CODE, detail="Not allowed, contact admin")
-
-    payload = payload.dict(exclude_unset=True)
-    payload["updated_at"] = datetime.now()
-    payload["last_updated_by"] = req_user.get("id")
-
-    await db["users"].update_one({"_id": PyObjectId(id)}, {"$set": payload})
-    updated_user = await db["users"].find_one({"_id": PyObjectId(id)})
-    updated_user = transform_mongo_data(updated_user)
-    return updated_user
+    return transform_mongo_data(updated_user)
 
 
 @router.patch("/{id}", response_model=UserInfoResponseSchema)
 async def update_user(
     id: str, payload: UserUpdateSchema, db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    user = await db["users"].find_one({"_id": PyObjectId(id)})
-    if not user:
+    payload = payload.model_dump(exclude_unset=True)
+    updated_user = await update_document(
+        db["users"], {"_id": PyObjectId(id)}, {"$set": payload}
+    )
+    if not updated_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-
-    payload = payload.dict(exclude_unset=True)
-    payload["updated_at"] = datetime.now()
-    await db["users"].update_one({"_id": PyObjectId(id)}, {"$set": payload})
-    updated_user = await db["users"].find_one({"_id": PyObjectId(id)})
-    transform_mongo_data(update_user)
-    return updated_user
+    return transform_mongo_data(updated_user)
 
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -214,11 +325,10 @@ async def upload_user_image(
     file: UploadFile = File(...),
     current_user=Depends(auth_handler.auth_wrapper),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    http: HttpClient = Depends(get_http_client),
 ):
-    user = await db["users"].find_one({"_id": PyObjectId(id)})
     req_user = await get_current_user(current_user, db)
-
-    if not req_user["_id"] == user["_id"]:
+    if not req_user["_id"] == PyObjectId(id):
         raise HTTPException(status_code=400, detail="Not allowed, contact admin")
 
     if file.content_type not in ["image/jpeg", "image/png", "image/webp"]:
@@ -227,13 +337,11 @@ async def upload_user_image(
         )
 
     file_name = f"{uuid.uuid4()}"
-    res = cloudinary.uploader.upload(file.file, public_id=file_name)
+    res = await upload_image(http, file, public_id=file_name)
     image_url = res.get("url")
 
-    await db["users"].find_one_and_update(
-        {"_id": PyObjectId(id)},
-        {"$set": {"image_url": image_url}},
-        return_document=ReturnDocument.AFTER,
+    await update_document(
+        db["users"], {"_id": PyObjectId(id)}, {"$set": {"image_url": image_url}}
     )
     return {"detail": "Uploaded image successfully"}
 
@@ -2,7 +2,19 @@ from typing import Dict, List, Optional
 from bson import ObjectId
 from datetime import datetime
 
-from pydantic import BaseModel, EmailStr, Field, HttpUrl
+from pydantic import (
+    AliasChoices,
+    BaseModel,
+    ConfigDict,
+    EmailStr,
+    Field,
+    HttpUrl,
+    TypeAdapter,
+)
+
+from app.core._id import PyObjectId
+from app.core.geo import GeoPoint
+from app.core.helpers import MAX_BATCH_SIZE
 
 
 from enum import Enum
@@ -28,6 +40,7 @@ class UserRegisterSchema(BaseModel):
     last_name: Optional[str]
     phone: Optional[str]
     address: Optional[str]
+    location: Optional[GeoPoint] = None
     role: UserRole = UserRole.RETAILER
     is_active: bool = True
     is_admin: bool = False
@@ -49,6 +62,7 @@ class UserUpdateSchema(BaseModel):
     last_name: Optional[str]
     phone: Optional[str]
     address: Optional[str]
+    location: Optional[GeoPoint] = None
     role: Optional[UserRole] = None
 
 
@@ -59,28 +73,49 @@ class UserLoginResponseSchema(BaseModel):
     refresh_token: str
 
 
+class TokenRefreshSchema(BaseModel):
+    refresh_token: str
+
+
 class UserInfoResponseSchema(BaseModel):
-    id: str
+    model_config = ConfigDict(from_attributes=True)
+
+    # Accepts raw documents (``_id``) as well as transformed ones (``id``).
+    id: PyObjectId = Field(validation_alias=AliasChoices("id", "_id"))
     email: EmailStr
     first_name: Optional[str]
     middle_name: Optional[str]
     last_name: Optional[str]
     phone: Optional[str]
     address: Optional[str]
+    location: Optional[GeoPoint] = None
     is_active: bool
     role: UserRole
     created_at: datetime
     image_url: Optional[str] = None
     mfa_enabled: bool = False
 
-    class Config:
-        from_attributes = True
-
 
 class UserInfoPaginatedResponseSchema(BaseModel):
     items: List[UserInfoResponseSchema]
     meta: Dict
 
 
+class UserBatchRequestSchema(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class UserBatchResponseSchema(BaseModel):
+    items: List[UserInfoResponseSchema]
+    missing: List[str]
+    forbidden: List[str]
+
+
 class MFARequest(BaseModel):
     otp_code: str
+
+
+# Built once at import; validating a page through these avoids FastAPI's
+# per-item response_model round trip.
+UserInfoListAdapter = TypeAdapter(List[UserInfoResponseSchema])
+UserBatchResponseAdapter = TypeAdapter(UserBatchResponseSchema)
@@ -1,29 +1,167 @@
 import base64
 import io
-import pyotp
-import qrcode
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
 from fastapi import Depends, HTTPException
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
 
+from app.core import settings
 from app.core._id import PyObjectId
+from app.core.auth import AuthHandler
 from app.core.database import get_database
 
+REFRESH_TOKENS_COLLECTION = "refresh_tokens"
+auth_handler = AuthHandler()
+
 
 async def get_current_user(email, db):
     return await db["users"].find_one({"email": email})
 
 
+def issue_refresh_token(user, family=None):
+    """
+    Mint a refresh token for ``user``. Nothing is stored: a token is only
+    recorded once it is used, so logging in stays free of writes.
+    """
+    return auth_handler.encode_refresh_token(user["email"], family=family)
+
+
+def _revoked_family_id(family):
+    return f"revoked:{family}"
+
+
+async def revoke_refresh_family(db, family):
+    """
+    Reject every token rotated from the same login. The marker outlives any
+    token the family has issued so far, then expires through the TTL index.
+    """
+    expires_at = datetime.now() + timedelta(
+        days=int(settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    await db[REFRESH_TOKENS_COLLECTION].update_one(
+        {"_id": _revoked_family_id(family)},
+        {"$set": {"family": family, "expires_at": expires_at}},
+        upsert=True,
+    )
+
+
+async def rotate_refresh_token(db, token):
+    """
+    Exchange a refresh token for a new access/refresh pair without touching
+    the password. Using a token inserts a record under its ``jti``, so the
+    unique ``_id`` makes each token single-use; presenting one that was
+    already used means it leaked, and its whole family is revoked.
+    """
+    payload = auth_handler.decode_refresh_token(token)
+    tokens = db[REFRESH_TOKENS_COLLECTION]
+    family = payload["fam"]
+    if await tokens.find_one({"_id": _revoked_family_id(family)}, {"_id": 1}):
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+
+    try:
+        await tokens.insert_one(
+            {
+                "_id": payload["jti"],
+                "family": family,
+                "used_at": datetime.now(),
+                # Kept until the token would have expired anyway.
+                "expires_at": datetime.fromtimestamp(payload["exp"]),
+            }
+        )
+    except DuplicateKeyError:
+        await revoke_refresh_family(db, family)
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+
+    user = await db["users"].find_one(
+        {"email": payload["sub"]}, {"email": 1, "is_active": 1}
+    )
+    if not user or not user.get("is_active", True):
+        await revoke_refresh_family(db, family)
+        raise HTTPException(status_code=401, detail="User not found")
+
+    return {
+        "id": str(user["_id"]),
+        "email": user["email"],
+        "access_token": auth_handler.encode_token(user["email"]),
+        "refresh_token": issue_refresh_token(user, family),
+    }
+
+
 async def verify_2fa_otp(user, otp, db):
+    import pyotp
+
     totp = pyotp.TOTP(user["mfa_secret"])
     if totp.verify(otp):
         await db["users"].update_one(
-            {"_id": PyObjectId(user["_id"])}, {"$set": {"mfa_enabled": True}}
+            {"_id": PyObjectId(user["_id"])},
+            {
+                "$set": {"mfa_enabled": True, "updated_at": datetime.now()},
+                "$inc": {"version": 1},
+            },
         )
         return True
     return False
 
 
+MFA_ISSUER = "Foodnest Application"
+MFA_QRCODE_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+MFA_QRCODE_CACHE_SIZE = 1024
+# (user_id, format) -> ((secret, email), image). One entry per user and
+# format, so a replaced or disabled secret doesn't linger in memory.
+_mfa_qrcodes: Dict[Tuple[str, str], Tuple[Tuple[str, str], bytes]] = {}
+
+
+def render_mfa_qrcode(secret, email, image_format="png"):
+    """Render the provisioning QR code as PNG or SVG bytes."""
+    # qrcode pulls in Pillow; keep both off the import path until MFA is used.
+    import pyotp
+    import qrcode
+
+    otp_uri = pyotp.TOTP(secret).provisioning_uri(name=email, issuer_name=MFA_ISSUER)
+    if image_format == "svg":
+        import qrcode.image.svg
+
+        image = qrcode.make(otp_uri, image_factory=qrcode.image.svg.SvgPathImage)
+        return image.to_string()
+
+    buffer = io.BytesIO()
+    qrcode.make(otp_uri).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def forget_mfa_qrcodes(user_id):
+    for image_format in MFA_QRCODE_MEDIA_TYPES:
+        _mfa_qrcodes.pop((str(user_id), image_format), None)
+
+
+async def mfa_qrcode_image(user, image_format="png"):
+    """
+    The user's QR code, rendered in the threadpool off the event loop and
+    kept until the secret changes.
+    """
+    key = (str(user["_id"]), image_format)
+    source = (user["mfa_secret"], user["email"])
+    cached = _mfa_qrcodes.get(key)
+    if cached is not None and cached[0] == source:
+        return cached[1]
+
+    image = await run_in_threadpool(render_mfa_qrcode, *source, image_format)
+    _mfa_qrcodes.pop(key, None)
+    if len(_mfa_qrcodes) >= MFA_QRCODE_CACHE_SIZE:
+        # Drop the oldest entry; dicts keep insertion order.
+        del _mfa_qrcodes[next(iter(_mfa_qrcodes))]
+    _mfa_qrcodes[key] = (source, image)
+    return image
+
+
 async def generate_mfa_qrcode(user, db):
+    import pyotp
+
     if (
         "mfa_secret" not in user
         or "mfa_enabled" not in user
@@ -33,23 +171,20 @@ async def generate_mfa_qrcode(user, db):
         new_mfa_secret = pyotp.random_base32()
         await db["users"].update_one(
             {"_id": PyObjectId(user["_id"])},
-            {"$set": {"mfa_secret": new_mfa_secret, "mfa_enabled": True}},
+            {
+                "$set": {
+                    "mfa_secret": new_mfa_secret,
+                    "mfa_enabled": True,
+                    "updated_at": datetime.now(),
+                },
+                "$inc": {"version": 1},
+            },
         )
         user["mfa_secret"] = new_mfa_secret
+        forget_mfa_qrcodes(user["_id"])
 
-    otp_uri = pyotp.TOTP(user["mfa_secret"]).provisioning_uri(
-        name=user["email"], issuer_name="Foodnest Application"
-    )
-
-    qr = qrcode.make(otp_uri)
-    buffer = io.BytesIO()
-    qr.save(buffer, format="PNG")
-
-    buffer.seek(0)
-    qr_code_data_uri = (
-        f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
-    )
-
+    png = await mfa_qrcode_image(user)
+    qr_code_data_uri = f"data:image/png;base64,{base64.b64encode(png).decode('utf-8')}"
     return qr_code_data_uri, user["mfa_secret"]
 
 
@@ -65,7 +200,15 @@ async def disable_user_mfa(user, db):
 
     await db["users"].update_one(
         {"_id": PyObjectId(user["_id"])},
-        {"$set": {"mfa_secret": "", "mfa_enabled": False}},
+        {
+            "$set": {
+                "mfa_secret": "",
+                "mfa_enabled": False,
+                "updated_at": datetime.now(),
+            },
+            "$inc": {"version": 1},
+        },
     )
+    forget_mfa_qrcodes(user["_id"])
 
     return True
@@ -1,7 +1,7 @@
+import uuid
 from datetime import datetime, timedelta
 
 import jwt
-from decouple import config
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
@@ -12,7 +12,10 @@ from app.core import settings
 class AuthHandler:
     security = HTTPBearer()
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    secret = settings.SECRET_KEY
+
+    @property
+    def secret(self):
+        return settings.SECRET_KEY
 
     def get_password_hash(self, password):
         return self.pwd_context.hash(password)
@@ -29,12 +32,19 @@ class AuthHandler:
         }
         return jwt.encode(payload, self.secret, algorithm="HS256")
 
-    def encode_refresh_token(self, user_id):
+    def encode_refresh_token(self, user_id, jti=None, family=None, expires_at=None):
+        """
+        ``jti`` identifies this token and ``fam`` the login it was rotated
+        from, so reusing an old token can revoke every token of that login.
+        """
         payload = {
-            "exp": datetime.now()
+            "exp": expires_at
+            or datetime.now()
             + timedelta(days=int(settings.REFRESH_TOKEN_EXPIRE_DAYS), minutes=0),
             "iat": datetime.now(),
             "sub": user_id,
+            "jti": jti or uuid.uuid4().hex,
+            "fam": family or uuid.uuid4().hex,
         }
         return jwt.encode(payload, self.secret, algorithm="HS512")
 
@@ -47,5 +57,21 @@ class AuthHandler:
         except jwt.InvalidTokenError as e:
             raise HTTPException(status_code=401, detail="Invalid token")
 
+    def decode_refresh_token(self, token):
+        # Refresh tokens are the only HS512 tokens, so they can't be passed
+        # off as access tokens and vice versa.
+        try:
+            payload = jwt.decode(
+                token,
+                self.secret,
+                algorithms=["HS512"],
+                options={"require": ["exp", "sub", "jti", "fam"]},
+            )
+            return payload
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Signature has expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
     def auth_wrapper(self, auth: HTTPAuthorizationCredentials = Security(security)):
         return self.decode_token(auth.credentials)
@@ -0,0 +1,100 @@
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+
+# Fields maintained on every versioned write; enough to answer a conditional
+# request without loading the rest of the document.
+VERSION_FIELDS = {"version": 1, "updated_at": 1}
+CACHE_CONTROL = "private, no-cache"
+
+
+def document_etag(document, variant: str = "") -> str:
+    """
+    Strong ETag for a single document. ``variant`` distinguishes different
+    representations of the same version (e.g. a seller's view of an order).
+    """
+    etag = f"{document['_id']}-{document.get('version', 0)}"
+    return f'"{etag}-{variant}"' if variant else f'"{etag}"'
+
+
+def collection_etag(documents: Iterable[dict], *parts) -> str:
+    """Strong ETag for a list response from its members' IDs and versions."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(f"{part}|".encode())
+    for document in documents:
+        digest.update(f"{document['_id']}:{document.get('version', 0)};".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def page_versions_stage(page: int, page_size: int) -> dict:
+    """
+    ``$facet`` stage returning the versions of one page of results and the
+    total count, so a list's validators can be computed without loading
+    every matching document.
+    """
+    return {
+        "$facet": {
+            "items": [
+                {"$skip": (page - 1) * page_size},
+                {"$limit": page_size},
+                {"$project": VERSION_FIELDS},
+            ],
+            "total": [{"$count": "count"}],
+        }
+    }
+
+
+def last_modified(documents: Iterable[dict]):
+    dates = [d["updated_at"] for d in documents if d.get("updated_at")]
+    return max(dates) if dates else None
+
+
+def is_conditional(request: Request) -> bool:
+    headers = request.headers
+    return "if-none-match" in headers or "if-modified-since" in headers
+
+
+def is_not_modified(request: Request, etag: str, modified_at=None) -> bool:
+    """
+    Evaluate If-None-Match (which takes precedence) and If-Modified-Since.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified_at is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(modified_at.timestamp()) <= since
+    return False
+
+
+def _headers(etag: str, modified_at=None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if modified_at is not None:
+        headers["Last-Modified"] = formatdate(modified_at.timestamp(), usegmt=True)
+    return headers
+
+
+def not_modified(etag: str, modified_at=None) -> Response:
+    return Response(status_code=304, headers=_headers(etag, modified_at))
+
+
+def set_validators(response: Response, etag: str, modified_at=None):
+    response.headers.update(_headers(etag, modified_at))
+
+
+def check_not_modified(
+    request: Request, etag: str, modified_at=None
+) -> Optional[Response]:
+    """Return a 304 response when the client's copy is still current."""
+    if is_conditional(request) and is_not_modified(request, etag, modified_at):
+        return not_modified(etag, modified_at)
+    return None
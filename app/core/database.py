@@ -1,16 +1,137 @@
+import asyncio
+
 import motor.motor_asyncio
-from decouple import config
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+from pymongo.errors import DuplicateKeyError
+
+from app.core import memory_db, settings
+
+client = None
+db = None
+_index_task = None
+# pymongo command listeners attached when the client is created, e.g. the
+# query-plan auditor in tests.
+event_listeners = []
+# Run before a unique index can be built over data that predates it.
+MIGRATIONS = {"products": "python migrations/dedupe_products.py"}
+
+
+def get_indexes():
+    """(collection, keys, options) created in the background on startup."""
+    return [
+        (
+            "idempotency_keys",
+            [("created_at", ASCENDING)],
+            {"expireAfterSeconds": settings.IDEMPOTENCY_KEY_TTL_SECONDS},
+        ),
+        (
+            "products",
+            [("seller_id", ASCENDING), ("name", ASCENDING), ("description", ASCENDING)],
+            {"unique": True},
+        ),
+        ("products", [("status", ASCENDING), ("_id", ASCENDING)], {}),
+        (
+            "products",
+            [("category", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)],
+            {},
+        ),
+        ("products", [("location", GEOSPHERE)], {}),
+        ("product_images", [("product_id", ASCENDING)], {}),
+        ("users", [("email", ASCENDING)], {"unique": True}),
+        ("users", [("location", GEOSPHERE)], {}),
+        ("refresh_tokens", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+        (
+            "request_profiles",
+            [("created_at", ASCENDING)],
+            {"expireAfterSeconds": settings.PROFILE_TTL_SECONDS},
+        ),
+        ("orders", [("buyer_id", ASCENDING)], {}),
+        ("orders", [("seller_ids", ASCENDING)], {}),
+        ("orders", [("status", ASCENDING), ("updated_at", ASCENDING)], {}),
+        (
+            "dispatch_runs",
+            [("dispatcher_id", ASCENDING), ("created_at", DESCENDING)],
+            {},
+        ),
+        ("orders_archive", [("buyer_id", ASCENDING)], {}),
+        ("orders_archive", [("seller_ids", ASCENDING)], {}),
+    ]
+
+
+def connect():
+    global client, db
+    if client is None:
+        if settings.DATABASE_BACKEND == "memory":
+            if event_listeners:
+                # Nothing would be recorded, so an audit would pass vacuously.
+                raise RuntimeError(
+                    "Command listeners need a MongoDB server, not the memory backend."
+                )
+            # Data lives as long as the client; close_db() discards it.
+            client = memory_db.MemoryClient()
+        else:
+            client = motor.motor_asyncio.AsyncIOMotorClient(
+                settings.MONGO_DB_URL, event_listeners=list(event_listeners)
+            )
+        db = client[settings.MONGO_DB_NAME]
+    return db
 
-from app.core import settings
 
-DATABASE_URL = settings.MONGO_DB_URL
-client = motor.motor_asyncio.AsyncIOMotorClient(DATABASE_URL)
-db = client.foodnest_db
+async def ensure_unique_indexes(database):
+    """
+    Build the unique indexes. Duplicate checks (one account per email, one
+    product per seller/name/description, import dedup) rely on them, so a
+    failure is raised rather than logged.
+    """
+    for collection, keys, options in get_indexes():
+        if not options.get("unique"):
+            continue
+        try:
+            await database[collection].create_index(keys, **options)
+        except DuplicateKeyError as e:
+            if collection not in MIGRATIONS:
+                raise
+            raise RuntimeError(
+                f"{collection} has duplicates of {keys}; "
+                f"run `{MIGRATIONS[collection]}` first."
+            ) from e
+
+
+async def ensure_secondary_indexes(database):
+    for collection, keys, options in get_indexes():
+        if options.get("unique"):
+            continue
+        try:
+            await database[collection].create_index(keys, **options)
+        except Exception as e:
+            print(f"Could not create index {keys} on {collection}: {e}")
+
+
+async def ensure_indexes(database):
+    await ensure_unique_indexes(database)
+    await ensure_secondary_indexes(database)
 
 
 async def init_db():
+    global _index_task
+    database = connect()
+    # Writes must not be accepted before the unique indexes exist, so these
+    # hold up startup (and fail it); the rest are built in the background.
+    await ensure_unique_indexes(database)
+    _index_task = asyncio.create_task(ensure_secondary_indexes(database))
     print("Database connected")
 
 
+async def close_db():
+    global client, db, _index_task
+    if _index_task is not None and not _index_task.done():
+        _index_task.cancel()
+    if client is not None:
+        client.close()
+    client = db = _index_task = None
+
+
 def get_database():
-    return db
+    # The client is normally created in the app lifespan; fall back to a lazy
+    # connect for callers that run outside of it (scripts, bare TestClient).
+    return db if db is not None else connect()
@@ -0,0 +1,39 @@
+from typing import Any, Dict, Iterable, List, Optional, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+
+def allowed_fields(schema: Type[BaseModel], *extra: str) -> List[str]:
+    return [*schema.model_fields, *extra]
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """
+    Validate a ``?fields=`` value against the fields a response may contain.
+    Returns ``None`` when no fieldset was requested.
+    """
+    if not fields:
+        return None
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        msg = f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        raise HTTPException(status_code=400, detail=msg)
+    return requested
+
+
+def to_projection(fields: Optional[List[str]]) -> Optional[Dict[str, int]]:
+    """
+    Mongo projection for a fieldset. ``_id`` is always kept so documents can
+    still be joined and ordered; ``select_fields`` drops it afterwards.
+    """
+    if fields is None:
+        return None
+    return {"_id": 1, **{f: 1 for f in fields if f != "id"}}
+
+
+def select_fields(items: List[Dict[str, Any]], fields: Optional[List[str]]):
+    if fields is None:
+        return items
+    return [{f: item[f] for f in fields if f in item} for item in items]
@@ -0,0 +1,49 @@
+from typing import List, Literal, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel, Field, field_validator
+
+MAX_NEAR_RADIUS_METRES = 500_000
+
+
+class GeoPoint(BaseModel):
+    """A GeoJSON point. Coordinates are ``[longitude, latitude]``."""
+
+    type: Literal["Point"] = "Point"
+    coordinates: List[float] = Field(..., min_length=2, max_length=2)
+
+    @field_validator("coordinates")
+    @classmethod
+    def check_range(cls, coordinates):
+        lng, lat = coordinates
+        if not -180 <= lng <= 180 or not -90 <= lat <= 90:
+            raise ValueError("Coordinates must be [longitude, latitude].")
+        return coordinates
+
+
+def parse_near(near: str) -> GeoPoint:
+    """Parse a ``?near=lat,lng`` value into a point."""
+    try:
+        lat, lng = (float(part) for part in near.split(","))
+        return GeoPoint(coordinates=[lng, lat])
+    except ValueError:
+        msg = "near must be 'latitude,longitude' in decimal degrees."
+        raise HTTPException(status_code=400, detail=msg)
+
+
+def geo_near_stage(point: GeoPoint, radius: float, query: Optional[dict] = None):
+    """
+    A ``$geoNear`` stage (it has to come first in a pipeline) that returns
+    documents within ``radius`` metres of ``point``, nearest first, with the
+    distance in ``distance``. ``query`` is applied in the same index scan.
+    """
+    return {
+        "$geoNear": {
+            "near": point.model_dump(),
+            "key": "location",
+            "distanceField": "distance",
+            "maxDistance": radius,
+            "query": query or {},
+            "spherical": True,
+        }
+    }
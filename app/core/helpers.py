@@ -1,5 +1,5 @@
 from bson import ObjectId
-from typing import Any
+from typing import Any, List, Tuple
 
 
 def transform_mongo_data(data: Any) -> Any:
@@ -16,3 +16,30 @@ def transform_mongo_data(data: Any) -> Any:
     if isinstance(data, ObjectId):
         return str(data)
     return data
+
+
+MAX_BATCH_SIZE = 100
+
+
+def parse_object_ids(ids: List[str]) -> Tuple[List[ObjectId], List[str]]:
+    """
+    Split requested IDs into unique valid ObjectIds and invalid strings.
+    """
+    valid, invalid, seen = [], [], set()
+    for id in ids:
+        if not ObjectId.is_valid(id):
+            invalid.append(id)
+        elif id not in seen:
+            seen.add(id)
+            valid.append(ObjectId(id))
+    return valid, invalid
+
+
+def order_by_ids(documents: List[dict], ids: List[ObjectId]):
+    """
+    Return documents in the order of ``ids`` plus the IDs that were not found.
+    """
+    by_id = {document["_id"]: document for document in documents}
+    found = [by_id[id] for id in ids if id in by_id]
+    missing = [str(id) for id in ids if id not in by_id]
+    return found, missing
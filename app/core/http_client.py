@@ -0,0 +1,194 @@
+import asyncio
+import random
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException
+
+from app.core import settings
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+# Errors raised before the request reached the server; safe to retry for
+# any method, including non-idempotent POSTs.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class UpstreamError(HTTPException):
+    def __init__(self, host: str, reason: str):
+        super().__init__(status_code=502, detail=f"{host} request failed: {reason}")
+
+
+class CircuitOpenError(HTTPException):
+    def __init__(self, host: str):
+        super().__init__(
+            status_code=503, detail=f"{host} is unavailable, try again later."
+        )
+
+
+class CircuitBreaker:
+    """
+    Per-host breaker: after ``threshold`` consecutive failures the circuit
+    opens and calls fail fast for ``reset_timeout`` seconds, after which one
+    trial request is let through (half-open) to decide whether to close it.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Half-open: let this request through, re-open on failure.
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class HttpClient:
+    """
+    Shared async HTTP client for outbound integrations: one keep-alive
+    connection pool for the whole app, a connection limit per host, timeouts,
+    retries with jittered exponential backoff and a circuit breaker per host.
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        max_connections: int,
+        max_connections_per_host: int,
+        retries: int,
+        backoff: float = 0.2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=transport,
+        )
+        self.max_connections_per_host = max_connections_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def _host_limit(self, host):
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_connections_per_host)
+        return self._host_limits[host]
+
+    def breaker(self, host) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(
+                self.failure_threshold, self.reset_timeout
+            )
+        return self._breakers[host]
+
+    async def _sleep_before_retry(self, attempt):
+        # Full jitter keeps clients that failed together from retrying together.
+        await asyncio.sleep(random.uniform(0, self.backoff * 2**attempt))
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request. Idempotent methods are retried on transport errors
+        and 429/5xx gateway responses; other methods only when the request
+        never reached the server. Request bodies must be replayable (bytes,
+        not streams) for retries to work.
+        """
+        method = method.upper()
+        host = urlsplit(url).netloc
+        breaker = self.breaker(host)
+        retryable = method in IDEMPOTENT_METHODS
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(host)
+            last_attempt = attempt == self.retries
+            try:
+                async with self._host_limit(host):
+                    response = await self.client.request(method, url, **kwargs)
+            except NOT_SENT_ERRORS as e:
+                breaker.record_failure()
+                if last_attempt:
+                    raise UpstreamError(host, type(e).__name__)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if last_attempt or not retryable:
+                    raise UpstreamError(host, type(e).__name__)
+            else:
+                if response.status_code < 500:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                if (
+                    response.status_code not in RETRY_STATUS_CODES
+                    or not retryable
+                    or last_attempt
+                ):
+                    return response
+            await self._sleep_before_retry(attempt)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+http_client: Optional[HttpClient] = None
+
+
+def create_http_client() -> HttpClient:
+    return HttpClient(
+        timeout=settings.HTTP_TIMEOUT_SECONDS,
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_connections_per_host=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+        retries=settings.HTTP_RETRIES,
+        failure_threshold=settings.HTTP_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=settings.HTTP_CIRCUIT_RESET_SECONDS,
+    )
+
+
+async def init_http_client():
+    global http_client
+    if http_client is None:
+        http_client = create_http_client()
+
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+    http_client = None
+
+
+def get_http_client() -> HttpClient:
+    # Created in the app lifespan; lazily for callers running outside of it.
+    global http_client
+    if http_client is None:
+        http_client = create_http_client()
+    return http_client
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import Header, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+
+COLLECTION = "idempotency_keys"
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+POLL_INTERVAL_SECONDS = 0.1
+WAIT_TIMEOUT_SECONDS = 30
+
+# Requests currently being computed by this process, keyed like the stored
+# records, so concurrent duplicates can await the original instead of polling.
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def idempotency_key(
+    key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
+):
+    return key
+
+
+def fingerprint(*parts) -> str:
+    """Stable hash of the request payload a key was first used with."""
+    data = json.dumps(jsonable_encoder(parts), sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _replay(record):
+    return JSONResponse(
+        content=record["body"],
+        status_code=record["status_code"],
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _check_fingerprint(record, request_fingerprint):
+    if record["fingerprint"] != request_fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request.",
+        )
+
+
+async def _wait_for_completion(record_id, db):
+    """Poll a record claimed by another worker process until it completes."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + WAIT_TIMEOUT_SECONDS
+    while loop.time() < deadline:
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        record = await db[COLLECTION].find_one({"_id": record_id})
+        if record is None or record["state"] == COMPLETED:
+            return record
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still in progress.",
+    )
+
+
+async def run_idempotent(
+    key: Optional[str],
+    scope: str,
+    request_fingerprint: str,
+    compute: Callable[[], Awaitable],
+    db,
+    status_code: int = status.HTTP_200_OK,
+):
+    """
+    Run ``compute`` once per (scope, key) and replay its response to retries.
+
+    The first request claims the key with an insert; retries that arrive while
+    it is running wait for it (in-process via a shared future, otherwise by
+    polling the record) and every later retry is answered from the stored
+    response until the record's TTL expires. Failed or cancelled requests
+    release the key so the client can retry them.
+    """
+    if not key:
+        return await compute()
+
+    record_id = f"{scope}:{key}"
+    inflight = _inflight.get(record_id)
+    if inflight is not None:
+        record = await asyncio.shield(inflight)
+        if record is None:
+            # The original request was cancelled and released the key.
+            return await run_idempotent(
+                key, scope, request_fingerprint, compute, db, status_code
+            )
+        _check_fingerprint(record, request_fingerprint)
+        return _replay(record)
+
+    try:
+        await db[COLLECTION].insert_one(
+            {
+                "_id": record_id,
+                "fingerprint": request_fingerprint,
+                "state": IN_PROGRESS,
+                "created_at": datetime.now(),
+            }
+        )
+    except DuplicateKeyError:
+        record = await db[COLLECTION].find_one({"_id": record_id})
+        if record is not None:
+            _check_fingerprint(record, request_fingerprint)
+            if record["state"] == IN_PROGRESS:
+                record = await _wait_for_completion(record_id, db)
+        if record is None:
+            # The original request failed and released the key.
+            return await run_idempotent(
+                key, scope, request_fingerprint, compute, db, status_code
+            )
+        return _replay(record)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[record_id] = future
+    try:
+        result = await compute()
+        record = {
+            "fingerprint": request_fingerprint,
+            "state": COMPLETED,
+            "status_code": status_code,
+            "body": jsonable_encoder(result),
+        }
+        await db[COLLECTION].update_one({"_id": record_id}, {"$set": record})
+        future.set_result(record)
+        return result
+    except BaseException as e:
+        # Release the key on errors and on cancellation (client disconnect,
+        # shutdown) alike, or retries would wait on it until the TTL expires.
+        # Shielded so a second cancellation can't interrupt the delete.
+        await asyncio.shield(db[COLLECTION].delete_one({"_id": record_id}))
+        if isinstance(e, Exception):
+            future.set_exception(e)
+            # Don't warn about an unretrieved exception when nobody was waiting.
+            future.exception()
+        raise
+    finally:
+        _inflight.pop(record_id, None)
+        if not future.done():
+            # Cancelled: waiters run the request again instead of inheriting
+            # the cancellation.
+            future.set_result(None)
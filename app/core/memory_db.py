@@ -0,0 +1,804 @@
+"""
+In-memory database backend.
+
+A small stand-in for the parts of Motor's ``AsyncIOMotorDatabase`` API the
+app uses, so routes can run against ``db["collection"]`` without a MongoDB
+server. Selected with ``DATABASE_BACKEND=memory``; meant for tests,
+benchmarks and local work, not production.
+
+Supported: ``find``/``find_one`` with projections, sort, skip and limit;
+inserts, updates, deletes, ``find_one_and_*`` and ``bulk_write``; the query
+operators ``$eq $ne $gt $gte $lt $lte $in $nin $exists $or $and $nor
+$elemMatch``; the update operators ``$set $unset $inc $push $pull
+$addToSet $setOnInsert``; and the aggregation stages ``$match $sort $skip
+$limit $project $lookup $facet $group $count $geoNear``. Unique indexes are
+enforced; other indexes (TTL, 2dsphere) are accepted and ignored.
+
+Anything else raises rather than being approximated, and updates are
+validated the way pymongo validates them (no empty update documents, no
+replacements passed as updates), so code that only passes here fails here.
+Database commands such as ``explain`` aren't available; the query-plan
+audit needs a real server.
+"""
+
+import math
+from datetime import datetime
+from typing import Any, Dict, List
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument
+from pymongo import UpdateMany, UpdateOne
+from pymongo.common import validate_ok_for_replace, validate_ok_for_update
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+DUPLICATE_KEY_ERROR = 11000
+EARTH_RADIUS_METRES = 6_378_100
+_MISSING = object()
+
+
+def _copy(value):
+    # Much cheaper than copy.deepcopy for plain BSON-like documents.
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+# -- reading paths ----------------------------------------------------------
+
+
+def _values(document, path):
+    """
+    Every value at a dotted ``path``, descending into arrays the way
+    MongoDB does: ``items.seller_id`` yields each item's ``seller_id``.
+    """
+    values = [document]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                else:
+                    found += [
+                        item[part]
+                        for item in value
+                        if isinstance(item, dict) and part in item
+                    ]
+        values = found
+    return values
+
+
+def _get(document, path, default=None):
+    values = _values(document, path)
+    return values[0] if values else default
+
+
+def _candidates(values):
+    """A field matches a condition if it or any of its array elements do."""
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _compare(left, right, op):
+    try:
+        return op(left, right)
+    except TypeError:
+        return False
+
+
+_COMPARISONS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+def _equals(values, expected):
+    if expected is None and not values:
+        return True
+    return any(value == expected for value in _candidates(values))
+
+
+def _matches_condition(values, condition):
+    if not (isinstance(condition, dict) and condition and _is_operator(condition)):
+        return _equals(values, condition)
+
+    for op, operand in condition.items():
+        if op == "$eq":
+            ok = _equals(values, operand)
+        elif op == "$ne":
+            ok = not _equals(values, operand)
+        elif op in _COMPARISONS:
+            ok = any(
+                _compare(value, operand, _COMPARISONS[op])
+                for value in _candidates(values)
+            )
+        elif op == "$in":
+            ok = any(_equals(values, item) for item in operand)
+        elif op == "$nin":
+            ok = not any(_equals(values, item) for item in operand)
+        elif op == "$exists":
+            ok = bool(values) == bool(operand)
+        elif op == "$elemMatch":
+            ok = any(
+                isinstance(item, dict) and matches(item, operand)
+                for value in values
+                if isinstance(value, list)
+                for item in value
+            )
+        elif op == "$not":
+            ok = not _matches_condition(values, operand)
+        else:
+            raise OperationFailure(f"Unsupported query operator {op}")
+        if not ok:
+            return False
+    return True
+
+
+def _is_operator(condition):
+    return all(key.startswith("$") for key in condition)
+
+
+def matches(document, query):
+    """Whether ``document`` matches the MongoDB ``query``."""
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            ok = any(matches(document, branch) for branch in condition)
+        elif key == "$and":
+            ok = all(matches(document, branch) for branch in condition)
+        elif key == "$nor":
+            ok = not any(matches(document, branch) for branch in condition)
+        else:
+            ok = _matches_condition(_values(document, key), condition)
+        if not ok:
+            return False
+    return True
+
+
+# -- projection and sorting -------------------------------------------------
+
+
+def _include(source, parts, target):
+    head, rest = parts[0], parts[1:]
+    if isinstance(source, list):
+        # Project each element of an array of subdocuments.
+        if not isinstance(target, list) or len(target) != len(source):
+            target = [{} for _ in source]
+        for item, projected in zip(source, target):
+            if isinstance(item, dict):
+                _include(item, parts, projected)
+        return target
+    if not isinstance(source, dict) or head not in source:
+        return target
+    if not rest:
+        target[head] = _copy(source[head])
+    elif isinstance(source[head], (dict, list)):
+        default = [] if isinstance(source[head], list) else {}
+        target[head] = _include(source[head], rest, target.get(head, default))
+    return target
+
+
+def project(document, projection):
+    if not projection:
+        return _copy(document)
+    if isinstance(projection, (list, tuple)):
+        projection = dict.fromkeys(projection, 1)
+
+    include_id = projection.get("_id", 1)
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    if all(not value for value in fields.values()):
+        projected = _copy(document)
+        for path in fields:
+            _unset(projected, path)
+    else:
+        projected = {}
+        for path in fields:
+            _include(document, path.split("."), projected)
+    if include_id and "_id" in document:
+        projected = {"_id": document["_id"], **projected}
+    else:
+        projected.pop("_id", None)
+    return projected
+
+
+def _sort_key(value):
+    # MongoDB orders missing/null before numbers before strings before the rest.
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, ObjectId):
+        return (3, value.binary)
+    if isinstance(value, datetime):
+        return (4, value)
+    return (6, str(value))
+
+
+def sort_documents(documents, keys):
+    for path, direction in reversed(keys):
+        documents.sort(
+            key=lambda document: _sort_key(_get(document, path)),
+            reverse=direction < 0,
+        )
+    return documents
+
+
+def _sort_keys(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+# -- updates ----------------------------------------------------------------
+
+
+def _parent(document, path, create=True):
+    *parents, leaf = path.split(".")
+    target = document
+    for part in parents:
+        if isinstance(target, list) and part.isdigit():
+            target = target[int(part)]
+            continue
+        if part not in target or not isinstance(target[part], (dict, list)):
+            if not create:
+                return None, leaf
+            target[part] = {}
+        target = target[part]
+    return target, leaf
+
+
+def _set(document, path, value):
+    parent, leaf = _parent(document, path)
+    if isinstance(parent, list):
+        parent[int(leaf)] = value
+    else:
+        parent[leaf] = value
+
+
+def _unset(document, path):
+    parent, leaf = _parent(document, path, create=False)
+    if isinstance(parent, dict):
+        parent.pop(leaf, None)
+
+
+def _pull_matches(item, condition):
+    if isinstance(condition, dict) and not _is_operator(condition):
+        return isinstance(item, dict) and matches(item, condition)
+    return _matches_condition([item], condition)
+
+
+def apply_update(document, update, inserting=False, replace=False):
+    """Apply an update document (operators or a replacement) in place."""
+    if replace:
+        _id = document.get("_id")
+        document.clear()
+        document.update(_copy(update))
+        if _id is not None:
+            document["_id"] = _id
+        return
+
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                _set(document, path, _copy(value))
+            elif op == "$setOnInsert":
+                continue
+            elif op == "$unset":
+                _unset(document, path)
+            elif op == "$inc":
+                _set(document, path, _get(document, path, 0) + value)
+            elif op in ("$push", "$addToSet"):
+                items = (
+                    value["$each"]
+                    if isinstance(value, dict) and "$each" in value
+                    else [value]
+                )
+                current = _get(document, path, _MISSING)
+                current = [] if current is _MISSING or current is None else current
+                for item in items:
+                    if op == "$push" or item not in current:
+                        current.append(_copy(item))
+                _set(document, path, current)
+            elif op == "$pull":
+                current = _get(document, path)
+                if isinstance(current, list):
+                    current[:] = [
+                        item for item in current if not _pull_matches(item, value)
+                    ]
+            else:
+                raise OperationFailure(f"Unsupported update operator {op}")
+
+
+def _upsert_seed(query):
+    seed = {}
+    for key, value in query.items():
+        if key.startswith("$"):
+            continue
+        if isinstance(value, dict) and _is_operator(value):
+            if "$eq" in value:
+                _set(seed, key, _copy(value["$eq"]))
+        else:
+            _set(seed, key, _copy(value))
+    return seed
+
+
+# -- aggregation ------------------------------------------------------------
+
+
+def _expression(document, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get(document, expression[1:])
+    if isinstance(expression, dict):
+        return {key: _expression(document, value) for key, value in expression.items()}
+    return expression
+
+
+def _group(documents, spec):
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for document in documents:
+        key = _expression(document, spec["_id"])
+        hashable = repr(key)
+        group = groups.setdefault(hashable, {"_id": key})
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            ((op, operand),) = accumulator.items()
+            value = _expression(document, operand)
+            if op == "$sum":
+                group[field] = group.get(field, 0) + (
+                    value if isinstance(value, (int, float)) else 0
+                )
+            elif op == "$push":
+                group.setdefault(field, []).append(_copy(value))
+            elif op == "$first":
+                group.setdefault(field, _copy(value))
+            elif op == "$last":
+                group[field] = _copy(value)
+            elif op in ("$min", "$max"):
+                current = group.get(field)
+                pick = min if op == "$min" else max
+                group[field] = value if current is None else pick(current, value)
+            else:
+                raise OperationFailure(f"Unsupported accumulator {op}")
+    return list(groups.values())
+
+
+def _distance(a, b):
+    """Great-circle distance in metres between two [lng, lat] points."""
+    lng1, lat1, lng2, lat2 = map(math.radians, (*a, *b))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METRES * math.asin(math.sqrt(h))
+
+
+def _geo_near(documents, spec):
+    origin = spec["near"]["coordinates"]
+    key = spec.get("key", "location")
+    results = []
+    for document in documents:
+        point = _get(document, key)
+        if not (isinstance(point, dict) and point.get("coordinates")):
+            continue
+        if not matches(document, spec.get("query")):
+            continue
+        distance = _distance(origin, point["coordinates"])
+        if distance <= spec.get("maxDistance", math.inf):
+            results.append((distance, document))
+    results.sort(key=lambda result: result[0])
+    for distance, document in results:
+        document[spec["distanceField"]] = distance
+    return [document for _, document in results]
+
+
+class MemoryCursor:
+    def __init__(self, documents):
+        self._documents = documents
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        sort_documents(self._documents, _sort_keys(key_or_list, direction))
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _results(self):
+        end = self._skip + self._limit if self._limit else None
+        return self._documents[self._skip : end]
+
+    async def to_list(self, length=None):
+        results = self._results()
+        return results[:length] if length else results
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._results():
+            yield document
+
+
+class MemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._documents: Dict[Any, dict] = {}
+        self._unique: List[List[str]] = []
+        self._indexes: Dict[str, dict] = {"_id_": {"key": [("_id", 1)]}}
+
+    # indexes
+
+    async def create_index(self, keys, **options):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = options.get("name") or "_".join(f"{k}_{d}" for k, d in keys)
+        fields = [key for key, _ in keys]
+        if options.get("unique") and fields not in self._unique:
+            # Like MongoDB, refuse to build over existing duplicates.
+            seen = set()
+            for document in self._documents.values():
+                key = repr([_get(document, field) for field in fields])
+                if key in seen:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} "
+                        f"index: {name} dup key",
+                        DUPLICATE_KEY_ERROR,
+                    )
+                seen.add(key)
+            self._unique.append(fields)
+        self._indexes[name] = {"key": list(keys), **options}
+        return name
+
+    async def index_information(self):
+        return {name: dict(info) for name, info in self._indexes.items()}
+
+    def _check_unique(self, document, ignore_id=_MISSING):
+        for fields in self._unique:
+            key = [_get(document, field) for field in fields]
+            for other in self._documents.values():
+                if other["_id"] == ignore_id:
+                    continue
+                if [_get(other, field) for field in fields] == key:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} "
+                        f"index: {'_'.join(fields)} dup key",
+                        DUPLICATE_KEY_ERROR,
+                    )
+
+    # reads
+
+    def _matching(self, query):
+        return [
+            document
+            for document in self._documents.values()
+            if matches(document, query)
+        ]
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0):
+        documents = [project(d, projection) for d in self._matching(filter)]
+        cursor = MemoryCursor(documents)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    async def find_one(self, filter=None, projection=None, sort=None):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        documents = self._matching(filter)
+        if sort:
+            sort_documents(documents, _sort_keys(sort))
+        return project(documents[0], projection) if documents else None
+
+    async def count_documents(self, filter, **kwargs):
+        return len(self._matching(filter))
+
+    def aggregate(self, pipeline, **kwargs):
+        documents = [_copy(document) for document in self._documents.values()]
+        return MemoryCursor(self.database.run_pipeline(documents, pipeline))
+
+    # writes
+
+    def _insert(self, document):
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._documents:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name} index: _id_",
+                DUPLICATE_KEY_ERROR,
+            )
+        self._check_unique(document)
+        self._documents[document["_id"]] = _copy(document)
+        return document["_id"]
+
+    async def insert_one(self, document, **kwargs):
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents, ordered=True, **kwargs):
+        inserted, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                inserted.append(self._insert(document))
+            except DuplicateKeyError as e:
+                errors.append(
+                    {"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e)}
+                )
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError(
+                {
+                    "writeErrors": errors,
+                    "nInserted": len(inserted),
+                    "nMatched": 0,
+                    "nModified": 0,
+                    "nUpserted": 0,
+                    "nRemoved": 0,
+                    "upserted": [],
+                }
+            )
+        return InsertManyResult(inserted, True)
+
+    def _update(
+        self, query, update, many=False, upsert=False, sort=None, replace=False
+    ):
+        """Returns (matched, modified, upserted_id, [(before, after)])."""
+        # pymongo's own checks: no empty updates, no replacements passed
+        # as updates and vice versa.
+        (validate_ok_for_replace if replace else validate_ok_for_update)(update)
+        targets = self._matching(query)
+        if sort:
+            sort_documents(targets, _sort_keys(sort))
+        if not many:
+            targets = targets[:1]
+
+        changes = []
+        for document in targets:
+            before = _copy(document)
+            after = _copy(document)
+            apply_update(after, update, replace=replace)
+            if after != before:
+                self._check_unique(after, ignore_id=after["_id"])
+                self._documents[after["_id"]] = after
+            changes.append((before, after))
+
+        if not targets and upsert:
+            document = _upsert_seed(query)
+            apply_update(document, update, inserting=True, replace=replace)
+            upserted_id = self._insert(document)
+            return 0, 0, upserted_id, [(None, self._documents[upserted_id])]
+        modified = sum(1 for before, after in changes if before != after)
+        return len(targets), modified, None, changes
+
+    def _update_result(self, matched, modified, upserted_id):
+        raw = {"n": matched + (upserted_id is not None), "nModified": modified}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    async def update_one(self, filter, update, upsert=False, **kwargs):
+        matched, modified, upserted_id, _ = self._update(filter, update, upsert=upsert)
+        return self._update_result(matched, modified, upserted_id)
+
+    async def update_many(self, filter, update, upsert=False, **kwargs):
+        matched, modified, upserted_id, _ = self._update(
+            filter, update, many=True, upsert=upsert
+        )
+        return self._update_result(matched, modified, upserted_id)
+
+    async def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        matched, modified, upserted_id, _ = self._update(
+            filter, replacement, upsert=upsert, replace=True
+        )
+        return self._update_result(matched, modified, upserted_id)
+
+    async def find_one_and_update(
+        self,
+        filter,
+        update,
+        projection=None,
+        sort=None,
+        upsert=False,
+        return_document=ReturnDocument.BEFORE,
+        **kwargs,
+    ):
+        _, _, _, changes = self._update(filter, update, upsert=upsert, sort=sort)
+        if not changes:
+            return None
+        before, after = changes[0]
+        document = after if return_document == ReturnDocument.AFTER else before
+        return project(document, projection) if document is not None else None
+
+    async def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        targets = self._matching(filter)
+        if sort:
+            sort_documents(targets, _sort_keys(sort))
+        if not targets:
+            return None
+        document = self._documents.pop(targets[0]["_id"])
+        return project(document, projection)
+
+    async def delete_one(self, filter, **kwargs):
+        targets = self._matching(filter)[:1]
+        for document in targets:
+            del self._documents[document["_id"]]
+        return DeleteResult({"n": len(targets)}, True)
+
+    async def delete_many(self, filter, **kwargs):
+        targets = self._matching(filter)
+        for document in targets:
+            del self._documents[document["_id"]]
+        return DeleteResult({"n": len(targets)}, True)
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        counts = dict.fromkeys(
+            ("nInserted", "nMatched", "nModified", "nUpserted", "nRemoved"), 0
+        )
+        upserted, errors = [], []
+        for request in requests:
+            # pymongo validates the whole batch before sending any of it.
+            if isinstance(request, ReplaceOne):
+                validate_ok_for_replace(request._doc)
+            elif isinstance(request, (UpdateOne, UpdateMany)):
+                validate_ok_for_update(request._doc)
+        for index, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    counts["nInserted"] += 1
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    matching = self._matching(request._filter)
+                    if isinstance(request, DeleteOne):
+                        matching = matching[:1]
+                    for document in matching:
+                        del self._documents[document["_id"]]
+                    counts["nRemoved"] += len(matching)
+                elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    matched, modified, upserted_id, _ = self._update(
+                        request._filter,
+                        request._doc,
+                        many=isinstance(request, UpdateMany),
+                        upsert=bool(request._upsert),
+                        replace=isinstance(request, ReplaceOne),
+                    )
+                    counts["nMatched"] += matched
+                    counts["nModified"] += modified
+                    if upserted_id is not None:
+                        counts["nUpserted"] += 1
+                        upserted.append({"index": index, "_id": upserted_id})
+                else:
+                    raise OperationFailure(f"Unsupported bulk operation {request!r}")
+            except DuplicateKeyError as e:
+                errors.append(
+                    {"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e)}
+                )
+                if ordered:
+                    break
+        result = {**counts, "upserted": upserted}
+        if errors:
+            raise BulkWriteError({**result, "writeErrors": errors})
+        return BulkWriteResult(result, True)
+
+    async def drop(self):
+        self._documents.clear()
+
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    def get_collection(self, name):
+        return self[name]
+
+    async def list_collection_names(self):
+        return list(self._collections)
+
+    async def command(self, command, **kwargs):
+        # There are no query plans or server state to report, so fail loudly
+        # rather than return something an explain-based check would accept.
+        raise OperationFailure(
+            f"The {next(iter(command))} command needs a MongoDB server."
+        )
+
+    def run_pipeline(self, documents, pipeline, in_facet=False):
+        for index, stage in enumerate(pipeline):
+            ((name, spec),) = stage.items()
+            if name == "$geoNear" and (index or in_facet):
+                raise OperationFailure(
+                    "$geoNear is only valid as the first stage in a pipeline."
+                )
+            if name == "$match":
+                documents = [d for d in documents if matches(d, spec)]
+            elif name == "$sort":
+                documents = sort_documents(documents, list(spec.items()))
+            elif name == "$skip":
+                documents = documents[spec:]
+            elif name == "$limit":
+                documents = documents[:spec]
+            elif name == "$project":
+                documents = [project(d, spec) for d in documents]
+            elif name == "$lookup":
+                foreign = self[spec["from"]]._documents.values()
+                for document in documents:
+                    local = _values(document, spec["localField"])
+                    document[spec["as"]] = [
+                        _copy(other)
+                        for other in foreign
+                        if any(
+                            _equals(_values(other, spec["foreignField"]), value)
+                            for value in _candidates(local)
+                        )
+                    ]
+            elif name == "$facet":
+                documents = [
+                    {
+                        field: self.run_pipeline(
+                            [_copy(d) for d in documents], sub_pipeline, in_facet=True
+                        )
+                        for field, sub_pipeline in spec.items()
+                    }
+                ]
+            elif name == "$group":
+                documents = _group(documents, spec)
+            elif name == "$count":
+                documents = [{spec: len(documents)}] if documents else []
+            elif name == "$geoNear":
+                documents = _geo_near(documents, spec)
+            else:
+                raise OperationFailure(f"Unsupported aggregation stage {name}")
+        return documents
+
+
+class MemoryClient:
+    """Stands in for ``AsyncIOMotorClient``; data lives as long as the client."""
+
+    def __init__(self, *args, **kwargs):
+        self._databases: Dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    def get_database(self, name):
+        return self[name]
+
+    async def drop_database(self, name):
+        self._databases.pop(getattr(name, "name", name), None)
+
+    def close(self):
+        pass
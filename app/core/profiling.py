@@ -0,0 +1,225 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core import settings
+from app.core._id import PyObjectId
+from app.core.auth import AuthHandler
+from app.core.database import get_database
+from app.core.singleflight import single_flight
+
+COLLECTION = "request_profiles"
+PROFILE_HEADER = b"x-profile"
+auth_handler = AuthHandler()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def _coroutine_frames(coro):
+    """
+    Frames of a suspended task, outermost first, following the ``await``
+    chain down to the innermost coroutine, plus what that one is awaiting.
+    """
+    frames, leaf = [], None
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            # Async generator asend/athrow wrappers and finished coroutines.
+            frame = getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaited = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        if awaited is None or not (
+            hasattr(awaited, "cr_frame") or hasattr(awaited, "gi_frame")
+        ):
+            leaf = awaited
+            break
+        coro = awaited
+    return frames, leaf
+
+
+class StackSampler:
+    """
+    Wall-clock sampler for one asyncio task, run from a background thread.
+
+    While the task is running on the event loop the loop thread's stack is
+    recorded; while it is suspended (e.g. awaiting a Motor round trip) its
+    coroutine chain is recorded with an ``[await ...]`` leaf, so time spent
+    waiting on I/O shows up in the profile too. Output is in collapsed-stack
+    format (``frame;frame;frame count``) as consumed by flamegraph.pl and
+    speedscope.
+    """
+
+    def __init__(self, task: asyncio.Task, interval: float):
+        self.task = task
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            stack = self._sample()
+            if stack:
+                self.samples[";".join(stack)] += 1
+
+    def _sample(self):
+        frames, leaf = _coroutine_frames(self.task.get_coro())
+        if not frames:
+            return None
+        if getattr(self.task.get_coro(), "cr_running", False):
+            # Running: take the real thread stack from the task's root frame.
+            thread_frame = sys._current_frames().get(self._loop_thread)
+            stack = []
+            while thread_frame is not None:
+                stack.append(thread_frame)
+                if thread_frame is frames[0]:
+                    break
+                thread_frame = thread_frame.f_back
+            if stack and stack[-1] is frames[0]:
+                return [_frame_label(f) for f in reversed(stack)]
+        labels = [_frame_label(f) for f in frames]
+        labels.append(f"[await {type(leaf).__name__}]")
+        return labels
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.items())
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when an admin sends ``X-Profile: 1`` or when it is
+    picked by ``PROFILE_SAMPLE_RATE``. The collapsed stacks are stored in
+    ``request_profiles`` and the response carries ``X-Profile-Id``; fetch
+    them from ``GET /profiles/{id}``. Other requests pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not await self._should_profile(scope):
+            return await self.app(scope, receive, send)
+
+        profile_id = ObjectId()
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", str(profile_id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = StackSampler(
+            asyncio.current_task(), settings.PROFILE_INTERVAL_MS / 1000
+        )
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            await self._store(profile_id, scope, sampler)
+
+    async def _should_profile(self, scope) -> bool:
+        headers = dict(scope.get("headers", []))
+        if headers.get(PROFILE_HEADER) in (b"1", b"true"):
+            return await self._is_admin(headers.get(b"authorization"))
+        rate = settings.PROFILE_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    async def _is_admin(self, authorization: Optional[bytes]) -> bool:
+        scheme, _, token = (authorization or b"").decode().partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        try:
+            email = auth_handler.decode_token(token)
+        except HTTPException:
+            return False
+        user = await get_database()["users"].find_one({"email": email}, {"role": 1})
+        return bool(user) and user.get("role") == "admin"
+
+    async def _store(self, profile_id, scope, sampler):
+        try:
+            await get_database()[COLLECTION].insert_one(
+                {
+                    "_id": profile_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope.get("query_string", b"").decode(),
+                    "duration_ms": round(sampler.duration * 1000, 2),
+                    "interval_ms": settings.PROFILE_INTERVAL_MS,
+                    "samples": sum(sampler.samples.values()),
+                    "collapsed": sampler.collapsed(),
+                    "created_at": datetime.now(),
+                }
+            )
+        except Exception as e:
+            print(f"Could not store request profile {profile_id}: {e}")
+
+
+router = APIRouter(prefix="/profiles", tags=["Profiling"])
+
+
+# Declared before "/{id}" so the path isn't taken for a profile ID.
+@router.get("/coalescing")
+async def get_coalescing_stats(
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user=Depends(auth_handler.auth_wrapper),
+):
+    """Reads executed vs. coalesced by the single-flight layer, per read."""
+    user = await db["users"].find_one({"email": current_user}, {"role": 1})
+    if not user or user.get("role") != "admin":
+        msg = "Only admins are allowed to perform this action."
+        raise HTTPException(status_code=403, detail=msg)
+    return single_flight.stats()
+
+
+@router.get("/{id}", response_class=PlainTextResponse)
+async def get_request_profile(
+    id: str,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    current_user=Depends(auth_handler.auth_wrapper),
+):
+    """Collapsed stacks of a profiled request, ready for flamegraph.pl."""
+    user = await db["users"].find_one({"email": current_user}, {"role": 1})
+    if not user or user.get("role") != "admin":
+        msg = "Only admins are allowed to perform this action."
+        raise HTTPException(status_code=403, detail=msg)
+
+    profile = await db[COLLECTION].find_one({"_id": PyObjectId(id)})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={
+            "X-Profile-Path": profile["path"],
+            "X-Profile-Duration-Ms": str(profile["duration_ms"]),
+        },
+    )
@@ -0,0 +1,255 @@
+"""
+Query-plan auditing.
+
+``QueryAuditor`` records every distinct query shape the app sends to MongoDB
+(through a pymongo command listener) and runs ``explain`` on one example of
+each. Plans that scan a whole collection or sort an unbounded result set in
+memory are reported, so a missing index shows up in tests rather than in
+production::
+
+    auditor = QueryAuditor()
+    database.event_listeners.append(auditor.listener)
+    ...  # exercise the app
+    assert not await auditor.audit(database.db)
+"""
+
+import copy
+from dataclasses import dataclass
+
+from pymongo import monitoring
+
+# command name -> the field holding the collection name
+AUDITED_COMMANDS = {
+    "find": "find",
+    "aggregate": "aggregate",
+    "count": "count",
+    "distinct": "distinct",
+    "update": "update",
+    "delete": "delete",
+    "findAndModify": "findAndModify",
+}
+# Driver and session fields that explain rejects or that don't affect the plan.
+SESSION_FIELDS = {
+    "$db",
+    "$clusterTime",
+    "$readPreference",
+    "lsid",
+    "txnNumber",
+    "readConcern",
+    "writeConcern",
+    "apiVersion",
+    "apiStrict",
+    "apiDeprecationErrors",
+    "batchSize",
+    "singleBatch",
+}
+# Fields that don't change which plan the server picks.
+IGNORED_FIELDS = {"cursor", "documents", "update", "new", "upsert", "fields", "limit"}
+# Operators whose operand is a list of values rather than of sub-expressions.
+VALUE_LIST_OPERATORS = {"$in", "$nin", "$all"}
+# Non-operator keys whose values name fields or collections, not literals.
+LITERAL_FIELDS = {"from", "localField", "foreignField", "as"}
+
+
+@dataclass
+class QueryPlanIssue:
+    collection: str
+    command: str
+    shape: str
+    reason: str
+
+    def __str__(self):
+        return f"{self.command} on {self.collection}: {self.reason} ({self.shape})"
+
+
+def query_shape(value):
+    """
+    Replace the literal values in a filter, sort or pipeline with ``"?"``,
+    keeping field names and operators, so ``{"email": "a@b.c"}`` and
+    ``{"email": "x@y.z"}`` count as the same query.
+    """
+    if isinstance(value, list):
+        return [query_shape(item) for item in value]
+    if not isinstance(value, dict):
+        return "?"
+
+    shape = {}
+    for key, item in value.items():
+        if key in VALUE_LIST_OPERATORS:
+            shape[key] = "?"
+        elif isinstance(item, (dict, list)):
+            shape[key] = query_shape(item)
+        elif key.startswith("$") or key in LITERAL_FIELDS:
+            # Stage arguments such as a $lookup's collection are part of the shape.
+            shape[key] = item
+        else:
+            shape[key] = "?"
+    return shape
+
+
+def _shape_key(command_name, command):
+    parts = {
+        key: value
+        for key, value in command.items()
+        if key not in SESSION_FIELDS and key not in IGNORED_FIELDS
+    }
+    # Only a write's filter affects the plan, not what it changes.
+    for key in ("updates", "deletes"):
+        if key in parts:
+            parts[key] = [{"q": stmt.get("q")} for stmt in parts[key]]
+    return repr(query_shape(parts))
+
+
+class QueryShapeListener(monitoring.CommandListener):
+    """
+    Keeps the first command seen for each distinct query shape, keyed by
+    ``(database, command name, collection, shape)``.
+    """
+
+    def __init__(self):
+        self.commands = {}
+
+    def started(self, event):
+        if event.command_name not in AUDITED_COMMANDS:
+            return
+        command = event.command
+        collection = command.get(AUDITED_COMMANDS[event.command_name])
+        if not isinstance(collection, str):
+            # aggregate: 1 runs against the database, not a collection.
+            return
+        shape = _shape_key(event.command_name, command)
+        key = (event.database_name, event.command_name, collection, shape)
+        if key not in self.commands:
+            self.commands[key] = copy.deepcopy(dict(command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def explain_command(command_name, command):
+    """The ``explain`` command for a recorded command."""
+    explained = {
+        key: value for key, value in command.items() if key not in SESSION_FIELDS
+    }
+    if command_name == "aggregate":
+        explained["cursor"] = {}
+    if command_name == "update":
+        explained["updates"] = explained["updates"][:1]
+    if command_name == "delete":
+        explained["deletes"] = explained["deletes"][:1]
+    # explain has to be the first key of the command document.
+    return {"explain": explained, "verbosity": "queryPlanner"}
+
+
+def _plan_stages(node):
+    """Every plan stage in an explain document, however deeply nested."""
+    if isinstance(node, dict):
+        if "stage" in node:
+            yield node
+        for value in node.values():
+            yield from _plan_stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _plan_stages(item)
+
+
+def _winning_plans(explain):
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from _winning_plans(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from _winning_plans(item)
+
+
+def plan_issues(explain):
+    """Reasons a plan from ``explain`` is unacceptable."""
+    issues = []
+    for plan in _winning_plans(explain):
+        for stage in _plan_stages(plan):
+            name = stage["stage"]
+            if name == "COLLSCAN":
+                issues.append("collection scan")
+            elif name == "SORT" and not stage.get("limitAmount"):
+                issues.append("unbounded in-memory sort")
+            elif name == "EQ_LOOKUP" and stage.get("strategy") in (
+                "NestedLoopJoin",
+                "HashJoin",
+            ):
+                issues.append(f"$lookup on {stage.get('foreignCollection')} scans")
+    return sorted(set(issues))
+
+
+def _lookups(pipeline):
+    for stage in pipeline or []:
+        if "$lookup" in stage and "foreignField" in stage["$lookup"]:
+            yield stage["$lookup"]
+        for nested in (stage.get("$facet") or {}).values():
+            yield from _lookups(nested)
+
+
+def _is_unfiltered(command_name, command):
+    if command_name == "find":
+        return not command.get("filter") and not command.get("sort")
+    if command_name == "count":
+        return not command.get("query")
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        return not pipeline or not (
+            "$match" in pipeline[0]
+            or "$sort" in pipeline[0]
+            or "$geoNear" in pipeline[0]
+        )
+    return False
+
+
+class QueryAuditor:
+    """
+    Explains each recorded query shape and reports plans that don't use an
+    index. Queries with no filter at all (e.g. the admin user list) read the
+    whole collection by design, so their collection scans are only reported
+    with ``include_unfiltered``. Only shapes recorded against ``db`` are
+    explained.
+    """
+
+    def __init__(self, include_unfiltered=False):
+        self.listener = QueryShapeListener()
+        self.include_unfiltered = include_unfiltered
+
+    @property
+    def shapes(self):
+        return list(self.listener.commands)
+
+    async def _lookup_issues(self, db, lookup):
+        foreign = lookup["foreignField"]
+        if foreign == "_id":
+            return []
+        indexes = await db[lookup["from"]].index_information()
+        if any(index["key"][0][0] == foreign for index in indexes.values()):
+            return []
+        return [f"$lookup on {lookup['from']}.{foreign} has no index"]
+
+    async def audit(self, db):
+        """Explain every recorded shape; returns a list of QueryPlanIssue."""
+        found = []
+        for key, command in list(self.listener.commands.items()):
+            database, command_name, collection, shape = key
+            if database != db.name:
+                continue
+            explain = await db.command(explain_command(command_name, command))
+            reasons = plan_issues(explain)
+            if not self.include_unfiltered and _is_unfiltered(command_name, command):
+                reasons = [r for r in reasons if r != "collection scan"]
+            for lookup in _lookups(command.get("pipeline")):
+                reasons += await self._lookup_issues(db, lookup)
+            found += [
+                QueryPlanIssue(collection, command_name, shape, reason)
+                for reason in reasons
+            ]
+        return found
@@ -0,0 +1,25 @@
+from typing import Any, Dict
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+
+def json_response(adapter: TypeAdapter, data: Any, **kwargs) -> Response:
+    """
+    Validate ``data`` with a prebuilt ``TypeAdapter`` and serialize it in one
+    pass, skipping FastAPI's per-item ``response_model`` validation.
+    """
+    return Response(
+        adapter.dump_json(adapter.validate_python(data)),
+        media_type="application/json",
+        **kwargs,
+    )
+
+
+def paginated_json_response(
+    adapter: TypeAdapter, paginated: Dict[str, Any], **kwargs
+) -> Response:
+    """Like ``json_response`` for ``paginate`` output; validates ``items``."""
+    paginated = {**paginated, "items": adapter.validate_python(paginated["items"])}
+    return Response(to_json(paginated), media_type="application/json", **kwargs)
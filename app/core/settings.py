@@ -1,12 +1,56 @@
+"""
+Application settings.
+
+Values are resolved from the environment (or ``.env``) on first access rather
+than at import time, so importing the app does not require every secret to be
+present and a missing value only fails the code path that needs it.
+"""
+
+from functools import lru_cache
+
 from decouple import config
 
-MONGO_DB_URL = config("MONGO_DB_URL")
-SECRET_KEY = config("SECRET_KEY")
-ACCESS_TOKEN_EXPIRE_MINUTES = config("ACCESS_TOKEN_EXPIRE_MINUTES")
-REFRESH_TOKEN_EXPIRE_DAYS = config("REFRESH_TOKEN_EXPIRE_DAYS")
+# name -> keyword arguments forwarded to ``decouple.config``
+_SETTINGS = {
+    # "mongo", or "memory" for the in-process backend used by offline tests
+    # and benchmarks.
+    "DATABASE_BACKEND": {"default": "mongo"},
+    "MONGO_DB_URL": {},
+    "MONGO_DB_NAME": {"default": "foodnest_db"},
+    "SECRET_KEY": {},
+    "ACCESS_TOKEN_EXPIRE_MINUTES": {},
+    "REFRESH_TOKEN_EXPIRE_DAYS": {},
+    "CLOUD_NAME": {},
+    "CLOUDINARY_API_KEY": {},
+    "CLOUDINARY_API_SECRET": {},
+    "MAILGUN_API_KEY": {},
+    "IDEMPOTENCY_KEY_TTL_SECONDS": {"default": 24 * 60 * 60, "cast": int},
+    "WRITE_BEHIND_FLUSH_SECONDS": {"default": 5.0, "cast": float},
+    "WRITE_BEHIND_MAX_ENTRIES": {"default": 10_000, "cast": int},
+    "ORDER_ARCHIVE_AFTER_DAYS": {"default": 90, "cast": int},
+    "ORDER_ARCHIVE_BATCH_SIZE": {"default": 500, "cast": int},
+    "ORDER_ARCHIVE_INTERVAL_SECONDS": {"default": 60 * 60, "cast": int},
+    "HTTP_TIMEOUT_SECONDS": {"default": 10.0, "cast": float},
+    "HTTP_MAX_CONNECTIONS": {"default": 100, "cast": int},
+    "HTTP_MAX_CONNECTIONS_PER_HOST": {"default": 20, "cast": int},
+    "HTTP_RETRIES": {"default": 2, "cast": int},
+    "HTTP_CIRCUIT_FAILURE_THRESHOLD": {"default": 5, "cast": int},
+    "HTTP_CIRCUIT_RESET_SECONDS": {"default": 30.0, "cast": float},
+    "DISPATCH_RUN_CAPACITY": {"default": 100, "cast": int},
+    "DISPATCH_RUN_MAX_STOPS": {"default": 15, "cast": int},
+    "FACETS_CACHE_TTL_SECONDS": {"default": 60.0, "cast": float},
+    "PROFILE_SAMPLE_RATE": {"default": 0.0, "cast": float},
+    "PROFILE_INTERVAL_MS": {"default": 5.0, "cast": float},
+    "PROFILE_TTL_SECONDS": {"default": 7 * 24 * 60 * 60, "cast": int},
+}
+
+
+@lru_cache(maxsize=None)
+def _resolve(name):
+    return config(name, **_SETTINGS[name])
 
-CLOUD_NAME = config("CLOUD_NAME")
-CLOUDINARY_API_KEY = config("CLOUDINARY_API_KEY")
-CLOUDINARY_API_SECRET = config("CLOUDINARY_API_SECRET")
 
-MAILGUN_API_KEY = config("MAILGUN_API_KEY")
+def __getattr__(name):
+    if name in _SETTINGS:
+        return _resolve(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
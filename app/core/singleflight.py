@@ -0,0 +1,49 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads: while a call for ``key`` is in
+    flight, later callers with the same key wait for its result instead of
+    issuing their own query. Nothing is kept once the call finishes, so this
+    never serves data older than the query that is running.
+
+    The shared call runs in its own task, so a caller that goes away (client
+    disconnect) doesn't cancel it for the others. Every caller gets the same
+    result object and must not mutate it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+        # name -> "executed" / "coalesced" counts
+        self.counters: Dict[str, Counter] = {}
+
+    async def do(self, name: str, key: Hashable, call: Callable[[], Awaitable[Any]]):
+        counters = self.counters.setdefault(name, Counter())
+        task = self._calls.get((name, key))
+        if task is None:
+            counters["executed"] += 1
+            task = asyncio.ensure_future(call())
+            self._calls[(name, key)] = task
+            task.add_done_callback(lambda t: self._done((name, key), t))
+        else:
+            counters["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away.
+            task.exception()
+
+    def stats(self):
+        return {
+            name: {"executed": c["executed"], "coalesced": c["coalesced"]}
+            for name, c in self.counters.items()
+        }
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,41 @@
+import hashlib
+import time
+
+from app.core import settings
+from app.core.http_client import UpstreamError
+
+CLOUDINARY_UPLOAD_URL = "https://api.cloudinary.com/v1_1/{cloud_name}/image/upload"
+
+
+def sign_upload(params: dict) -> str:
+    """Cloudinary API signature for a signed upload."""
+    to_sign = "&".join(f"{key}={params[key]}" for key in sorted(params))
+    return hashlib.sha1(
+        f"{to_sign}{settings.CLOUDINARY_API_SECRET}".encode()
+    ).hexdigest()
+
+
+async def upload_image(http, file, public_id):
+    """
+    Upload an image to Cloudinary's REST API through the shared HTTP client,
+    returning the parsed upload response (``url``, ``secure_url``, ...).
+    The file is read into memory first so the request can be retried. An
+    error response from Cloudinary is raised as an ``UpstreamError`` (502).
+    """
+    content = await file.read()
+    params = {"public_id": public_id, "timestamp": int(time.time())}
+    response = await http.post(
+        CLOUDINARY_UPLOAD_URL.format(cloud_name=settings.CLOUD_NAME),
+        data={
+            **params,
+            "api_key": settings.CLOUDINARY_API_KEY,
+            "signature": sign_upload(params),
+        },
+        files={"file": (file.filename, content, file.content_type)},
+    )
+    if response.is_error:
+        raise UpstreamError(response.url.host, f"HTTP {response.status_code}")
+    try:
+        return response.json()
+    except ValueError:
+        raise UpstreamError(response.url.host, "invalid JSON response")
@@ -0,0 +1,110 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.core import settings
+from app.core.database import get_database
+
+
+class WriteBehindBuffer:
+    """
+    Buffers ``$set`` updates for low-value fields (``last_login`` and other
+    telemetry) and flushes them in a single unordered ``bulk_write`` per
+    collection.
+
+    Updates to the same document are merged, so memory is bounded by the
+    number of distinct documents touched between flushes; once ``max_entries``
+    is reached a flush is triggered immediately. Buffered writes can be lost
+    if the process dies or a flush fails, so only use it for data that is fine
+    to drop.
+    """
+
+    def __init__(
+        self, max_entries: Optional[int] = None, interval: Optional[float] = None
+    ):
+        self._max_entries = max_entries
+        self._interval = interval
+        self._pending: "OrderedDict[Tuple[str, Any], Dict[str, Any]]" = OrderedDict()
+        self._task = None
+        self._flushing = None
+        self._stopping = None
+
+    @property
+    def max_entries(self):
+        return self._max_entries or settings.WRITE_BEHIND_MAX_ENTRIES
+
+    @property
+    def interval(self):
+        return self._interval or settings.WRITE_BEHIND_FLUSH_SECONDS
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, collection: str, document_id, fields: Dict[str, Any]):
+        key = (collection, document_id)
+        self._pending.setdefault(key, {}).update(fields)
+        if len(self._pending) >= self.max_entries:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self, db=None):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, OrderedDict()
+
+        operations: Dict[str, list] = {}
+        for (collection, document_id), fields in pending.items():
+            operations.setdefault(collection, []).append(
+                UpdateOne({"_id": document_id}, {"$set": fields})
+            )
+
+        db = db if db is not None else get_database()
+        written = set()
+        try:
+            for collection, ops in operations.items():
+                try:
+                    await db[collection].bulk_write(ops, ordered=False)
+                except Exception as e:
+                    print(f"Write-behind flush to {collection} failed: {e}")
+                written.add(collection)
+        except asyncio.CancelledError:
+            self._requeue(pending, written)
+            raise
+
+    def _requeue(self, pending, written):
+        """Put back the part of an interrupted batch that wasn't written."""
+        for key, fields in pending.items():
+            if key[0] not in written:
+                # Anything recorded since the batch was taken is newer.
+                fields.update(self._pending.get(key, {}))
+                self._pending[key] = fields
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Let the loop finish any flush it has started, then flush the rest."""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._flushing is not None:
+            await self._flushing
+        await self.flush()
+
+
+telemetry = WriteBehindBuffer()
@@ -0,0 +1,40 @@
+"""
+Write helpers that hand back the written document, so routes can build
+their response without reading it again.
+"""
+
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+
+def versioned(document):
+    """Stamp a new document with timestamps and the first version."""
+    now = datetime.now()
+    document.setdefault("created_at", now)
+    document.setdefault("updated_at", now)
+    document.setdefault("version", 1)
+    return document
+
+
+async def insert_document(collection, document):
+    """Insert ``document`` and return it with its new ``_id``."""
+    result = await collection.insert_one(document)
+    return {**document, "_id": result.inserted_id}
+
+
+async def update_document(
+    collection, query, update, return_document=ReturnDocument.AFTER, **kwargs
+):
+    """
+    Apply ``update`` to the document matching ``query`` in one
+    ``find_one_and_update``, setting ``updated_at`` (unless the update sets
+    it) and bumping ``version``. Returns the updated document, or None if
+    nothing matched.
+    """
+    update = {**update}
+    update["$set"] = {"updated_at": datetime.now(), **update.get("$set", {})}
+    update["$inc"] = {**update.get("$inc", {}), "version": 1}
+    return await collection.find_one_and_update(
+        query, update, return_document=return_document, **kwargs
+    )
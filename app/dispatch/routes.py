@@ -0,0 +1,74 @@
+from typing import Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.accounts.permissions import hasAdminPermission, hasDispatcherPermission
+from app.accounts.services import get_current_user
+from app.core.auth import AuthHandler
+from app.core.database import get_database
+from app.core.helpers import transform_mongo_data
+from app.core.pagination import paginate
+from app.dispatch.schemas import DispatchClaimSchema, DispatchRunSchema
+from app.dispatch.services import RUNS_COLLECTION, claim_next_run, plan_runs
+
+auth_handler = AuthHandler()
+router = APIRouter(prefix="/dispatch", tags=["Dispatch"])
+
+
+@router.get("/batches")
+async def get_dispatch_batches(
+    seller_id: Optional[str] = None,
+    area: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=100),
+    current_user=Depends(auth_handler.auth_wrapper),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """Confirmed orders nobody has claimed yet, packed into delivery runs."""
+    req_user = await get_current_user(current_user, db)
+    if not (hasDispatcherPermission(req_user) or hasAdminPermission(req_user)):
+        raise HTTPException(status_code=403, detail="Not allowed.")
+
+    runs = await plan_runs(db, seller_id, area)
+    runs = [{k: v for k, v in run.items() if k != "loads"} for run in runs]
+    return paginate(transform_mongo_data(runs), page=page, page_size=page_size)
+
+
+@router.post(
+    "/batches", response_model=DispatchRunSchema, status_code=status.HTTP_201_CREATED
+)
+async def claim_dispatch_batch(
+    claim: DispatchClaimSchema = Body(DispatchClaimSchema()),
+    current_user=Depends(auth_handler.auth_wrapper),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """Assign the next delivery run to the current dispatcher."""
+    req_user = await get_current_user(current_user, db)
+    if not hasDispatcherPermission(req_user):
+        raise HTTPException(status_code=403, detail="Only dispatchers can claim runs.")
+
+    run = await claim_next_run(db, req_user["_id"], claim.seller_id, claim.area)
+    if run is None:
+        raise HTTPException(status_code=404, detail="No orders waiting for dispatch.")
+    return transform_mongo_data(run)
+
+
+@router.get("/runs")
+async def get_my_dispatch_runs(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=100),
+    current_user=Depends(auth_handler.auth_wrapper),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    req_user = await get_current_user(current_user, db)
+    if not hasDispatcherPermission(req_user):
+        raise HTTPException(status_code=403, detail="Not allowed.")
+
+    runs = await (
+        db[RUNS_COLLECTION]
+        .find({"dispatcher_id": str(req_user["_id"])})
+        .sort("created_at", -1)
+        .to_list(length=None)
+    )
+    return paginate(transform_mongo_data(runs), page=page, page_size=page_size)
@@ -0,0 +1,27 @@
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class DispatchRunStatus(str, Enum):
+    ASSIGNED = "assigned"
+    COMPLETED = "completed"
+
+
+class DispatchRunSchema(BaseModel):
+    id: Optional[str] = None
+    seller_id: str = Field(..., description="Where the run picks up")
+    pickup_address: Optional[str] = None
+    area: str = Field(..., description="Buyer address area the run delivers to")
+    order_ids: List[str]
+    load: int = Field(..., description="Total item quantity on the run")
+    dispatcher_id: Optional[str] = None
+    status: Optional[DispatchRunStatus] = None
+    created_at: Optional[datetime] = None
+
+
+class DispatchClaimSchema(BaseModel):
+    seller_id: Optional[str] = None
+    area: Optional[str] = None
@@ -0,0 +1,181 @@
+from collections import defaultdict
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.core import settings
+from app.core.helpers import parse_object_ids
+from app.dispatch.schemas import DispatchRunStatus
+from app.orders.schemas import OrderStatus
+
+RUNS_COLLECTION = "dispatch_runs"
+UNKNOWN_AREA = "unknown"
+LEG_FIELDS = {"buyer_id": 1, "items.seller_id": 1, "items.quantity": 1, "dispatch": 1}
+
+
+def address_area(address):
+    """
+    The locality of a free-text address: the part after the street line, so
+    "12 Allen Ave, Ikeja, Lagos" is in "ikeja". One-part addresses are used
+    as they are.
+    """
+    parts = [part.strip().lower() for part in (address or "").split(",")]
+    parts = [part for part in parts if part]
+    if not parts:
+        return UNKNOWN_AREA
+    return parts[1] if len(parts) > 1 else parts[0]
+
+
+async def load_dispatch_legs(db, seller_id=None):
+    """
+    One leg per (confirmed order, seller) that no run has claimed yet. An
+    order with items from several sellers needs a pickup from each of them.
+    Claimed legs are recorded on the order as ``dispatch.<seller_id>``.
+    """
+    orders = await (
+        db["orders"]
+        .find({"status": OrderStatus.CONFIRMED}, LEG_FIELDS)
+        .to_list(length=None)
+    )
+    legs = []
+    for order in orders:
+        loads = defaultdict(int)
+        for item in order.get("items", []):
+            if item.get("seller_id"):
+                loads[item["seller_id"]] += item.get("quantity", 0)
+        claimed = order.get("dispatch") or {}
+        for seller, load in loads.items():
+            if seller in claimed or (seller_id and seller != seller_id):
+                continue
+            legs.append(
+                {
+                    "order_id": order["_id"],
+                    "buyer_id": order["buyer_id"],
+                    "seller_id": seller,
+                    "load": load,
+                }
+            )
+    return legs
+
+
+async def user_addresses(db, ids):
+    object_ids, _ = parse_object_ids([str(id) for id in ids])
+    users = await (
+        db["users"]
+        .find({"_id": {"$in": object_ids}}, {"address": 1})
+        .to_list(length=None)
+    )
+    return {str(user["_id"]): user.get("address") for user in users}
+
+
+def pack_runs(legs, capacity, max_stops):
+    """
+    First-fit decreasing: take legs heaviest first and put each into the
+    first run that still has room, opening a new run when none does. A leg
+    heavier than ``capacity`` gets a run to itself.
+    """
+    runs = []
+    for leg in sorted(legs, key=lambda leg: -leg["load"]):
+        for run in runs:
+            fits = run["load"] + leg["load"] <= capacity
+            if fits and len(run["order_ids"]) < max_stops:
+                break
+        else:
+            run = {"order_ids": [], "loads": [], "load": 0}
+            runs.append(run)
+        run["order_ids"].append(leg["order_id"])
+        run["loads"].append(leg["load"])
+        run["load"] += leg["load"]
+    return runs
+
+
+async def plan_runs(db, seller_id=None, area=None):
+    """
+    Group unclaimed legs by seller pickup and buyer area and pack each group
+    into delivery runs bounded by ``DISPATCH_RUN_CAPACITY`` items and
+    ``DISPATCH_RUN_MAX_STOPS`` orders.
+    """
+    legs = await load_dispatch_legs(db, seller_id)
+    people = {leg["buyer_id"] for leg in legs} | {leg["seller_id"] for leg in legs}
+    addresses = await user_addresses(db, people)
+
+    groups = defaultdict(list)
+    for leg in legs:
+        leg_area = address_area(addresses.get(str(leg["buyer_id"])))
+        if area is None or leg_area == area.lower():
+            groups[(leg["seller_id"], leg_area)].append(leg)
+
+    runs = []
+    for (seller, leg_area), group in sorted(groups.items()):
+        for run in pack_runs(
+            group, settings.DISPATCH_RUN_CAPACITY, settings.DISPATCH_RUN_MAX_STOPS
+        ):
+            run.update(
+                seller_id=seller,
+                pickup_address=addresses.get(seller),
+                area=leg_area,
+            )
+            runs.append(run)
+    return runs
+
+
+async def claim_run(db, run, dispatcher_id):
+    """
+    Assign ``run`` to a dispatcher with one conditional ``update_many`` that
+    only takes legs nobody has claimed. If another dispatcher got some of
+    them first, the run shrinks to the legs that were won; returns None when
+    none were.
+    """
+    run_id = ObjectId()
+    field = f"dispatch.{run['seller_id']}"
+    now = datetime.now()
+    result = await db["orders"].update_many(
+        {
+            "_id": {"$in": run["order_ids"]},
+            "status": OrderStatus.CONFIRMED,
+            field: {"$exists": False},
+        },
+        {"$set": {field: run_id, "updated_at": now}, "$inc": {"version": 1}},
+    )
+    if not result.modified_count:
+        return None
+
+    loads = dict(zip(run["order_ids"], run["loads"]))
+    if result.modified_count < len(run["order_ids"]):
+        won = await (
+            db["orders"]
+            .find({"_id": {"$in": run["order_ids"]}, field: run_id}, {"_id": 1})
+            .to_list(length=None)
+        )
+        loads = {order["_id"]: loads[order["_id"]] for order in won}
+
+    run_doc = {
+        "_id": run_id,
+        "seller_id": run["seller_id"],
+        "pickup_address": run.get("pickup_address"),
+        "area": run["area"],
+        "order_ids": list(loads),
+        "load": sum(loads.values()),
+        "dispatcher_id": str(dispatcher_id),
+        "status": DispatchRunStatus.ASSIGNED,
+        "created_at": now,
+    }
+    try:
+        await db[RUNS_COLLECTION].insert_one(run_doc)
+    except Exception:
+        # Release the legs so they can be planned again.
+        await db["orders"].update_many(
+            {"_id": {"$in": run_doc["order_ids"]}, field: run_id},
+            {"$unset": {field: ""}, "$inc": {"version": 1}},
+        )
+        raise
+    return run_doc
+
+
+async def claim_next_run(db, dispatcher_id, seller_id=None, area=None):
+    """Claim the first planned run that still has unclaimed legs."""
+    for run in await plan_runs(db, seller_id, area):
+        claimed = await claim_run(db, run, dispatcher_id)
+        if claimed:
+            return claimed
+    return None
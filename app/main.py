@@ -1,20 +1,49 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-import requests
 
 from app.accounts.routes import router as accounts_router
 from app.products.routes import router as products_router
 from app.orders.routes import router as orders_router
-from app.core.database import init_db
+from app.dispatch.routes import router as dispatch_router
+from app.core.database import close_db, init_db
+from app.core.profiling import ProfilingMiddleware
+from app.core.profiling import router as profiling_router
+from app.core.http_client import (
+    HttpClient,
+    close_http_client,
+    get_http_client,
+    init_http_client,
+)
+from app.core.writebehind import telemetry
+from app.orders.tasks import run_order_archival
 from app.core import settings
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    await init_http_client()
+    telemetry.start()
+    archival = asyncio.create_task(run_order_archival())
+    yield
+    archival.cancel()
+    await telemetry.stop()
+    await close_http_client()
+    await close_db()
+
+
 origins = ["http://localhost:5173", "http://127.0.0.1:5173"]
-app = FastAPI(docs_url="/swagger", title="Foodnest")
+app = FastAPI(docs_url="/swagger", title="Foodnest", lifespan=lifespan)
+# from fastapi.staticfiles import StaticFiles
 # app.mount("/static", StaticFiles(directory="/static"), name="static")
 app.include_router(accounts_router, prefix="/api/v1")
 app.include_router(products_router, prefix="/api/v1")
 app.include_router(orders_router, prefix="/api/v1")
+app.include_router(dispatch_router, prefix="/api/v1")
+app.include_router(profiling_router, prefix="/api/v1")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -22,16 +51,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
 
 
-@app.on_event("startup")
-async def startup_event():
-    await init_db()
+@app.get("/")
+async def read_root():
+    return {"message": "Welcome to FastAPI!"}
 
 
 @app.get("/send-email")
-def send_simple_message():
-    return requests.post(
+async def send_simple_message(http: HttpClient = Depends(get_http_client)):
+    response = await http.post(
         "https://api.mailgun.net/v3/sandbox21403a81f8834248b0e09db371e795d3.mailgun.org/messages",
         auth=("api", settings.MAILGUN_API_KEY),
         data={
@@ -41,3 +71,6 @@ def send_simple_message():
             "text": "We are happy to have you here",
         },
     )
+    if response.is_error:
+        raise HTTPException(status_code=502, detail="Could not send email.")
+    return response.json()
@@ -1,31 +1,65 @@
-from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.accounts.permissions import (
     hasAdminPermission,
     hasOwnerPermission,
     hasRetailerPermission,
+    hasWholeSalerPermission,
 )
 from app.accounts.services import get_current_user
 from app.core._id import PyObjectId
 from app.core.auth import AuthHandler
+from app.core.conditional import (
+    VERSION_FIELDS,
+    check_not_modified,
+    document_etag,
+    is_conditional,
+    set_validators,
+)
 from app.core.database import get_database
+from app.core.fieldsets import (
+    allowed_fields,
+    parse_fields,
+    select_fields,
+    to_projection,
+)
 from app.core.helpers import transform_mongo_data
+from app.core.idempotency import fingerprint, idempotency_key, run_idempotent
 from app.core.pagination import paginate
-from app.orders.schemas import OrderCreateSchema, OrderItemDetail, OrderUpdateSchema
-from app.orders.services import order_create_job, order_update_job
+from app.core.serialization import json_response
+from app.orders.schemas import (
+    OrderCreateSchema,
+    OrderDetailSchema,
+    OrderItemDetail,
+    OrderItemDetailListAdapter,
+    OrderStatusUpdateSchema,
+    OrderUpdateSchema,
+)
+from app.orders.services import (
+    find_order,
+    find_orders,
+    order_create_job,
+    order_update_job,
+    seller_view,
+    transition_order,
+)
 
 ERROR_CODE = status.HTTP_404_NOT_FOUND
 auth_handler = AuthHandler()
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
+ORDER_LIST_FIELDS = allowed_fields(OrderDetailSchema)
+
 
 @router.get("/{id}")
 async def get_orders_by_id(
     id: str,
+    request: Request,
+    response: Response,
+    include_archived: bool = False,
     current_user=Depends(auth_handler.auth_wrapper),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
@@ -34,11 +68,39 @@ async def get_orders_by_id(
         msg = "Not allowed, contact Administrator"
         raise HTTPException(status_code=403, detail=msg)
 
-    order = await db["orders"].find_one({"_id": PyObjectId(id)})
+    # A conditional request only needs what the permission checks and the
+    # validators use; the full document is loaded when it has changed.
+    projection = (
+        {"buyer_id": 1, "seller_ids": 1, **VERSION_FIELDS}
+        if is_conditional(request)
+        else None
+    )
+    order = await find_order(db, id, include_archived, projection)
+    if not order:
+        raise HTTPException(status_code=ERROR_CODE, detail="Order does not exist.")
+
     if hasRetailerPermission(req_user) and not req_user["_id"] == order["buyer_id"]:
         msg = "Not allowed, contact Administrator"
         raise HTTPException(status_code=403, detail=msg)
 
+    seller_id = str(req_user["_id"])
+    is_seller = hasWholeSalerPermission(req_user)
+    if is_seller and seller_id not in order.get("seller_ids", []):
+        msg = "Not allowed, contact Administrator"
+        raise HTTPException(status_code=403, detail=msg)
+
+    # Sellers get a filtered representation, so it needs its own ETag.
+    variant = f"seller-{seller_id}" if is_seller else ""
+    if projection:
+        etag = document_etag(order, variant)
+        cached = check_not_modified(request, etag, order.get("updated_at"))
+        if cached:
+            return cached
+        order = await find_order(db, id, include_archived)
+
+    set_validators(response, document_etag(order, variant), order.get("updated_at"))
+    if is_seller:
+        order = seller_view(order, seller_id)
     order = transform_mongo_data(order)
     return order
 
@@ -46,6 +108,8 @@ async def get_orders_by_id(
 @router.get("/")
 async def get_my_orders(
     status: Optional[str] = None,
+    include_archived: bool = False,
+    fields: Optional[str] = Query(None, description="Comma-separated fields"),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     current_user=Depends(auth_handler.auth_wrapper),
@@ -55,21 +119,24 @@ async def get_my_orders(
     if not hasOwnerPermission(req_user):
         raise HTTPException(status_code=403, detail="Not allowed.")
 
+    fields = parse_fields(fields, ORDER_LIST_FIELDS)
+    seller_id = str(req_user["_id"])
     if hasAdminPermission(req_user):
-        orders = (
-            await db["orders"].find({"status": status}).to_list(length=None)
-            if status
-            else await db["orders"].find().to_list(length=None)
-        )
-        return orders
-
-    query = {"$or": [{"buyer_id": req_user["_id"]}, {"seller_id": req_user["_id"]}]}
+        query = {}
+    elif hasWholeSalerPermission(req_user):
+        query = {"seller_ids": seller_id}
+    else:
+        query = {"buyer_id": req_user["_id"]}
     if status:
         query["status"] = status
 
-    orders = await db["orders"].find(query).to_list(length=None)
+    orders = await find_orders(db, query, to_projection(fields), include_archived)
+    if hasWholeSalerPermission(req_user):
+        orders = [seller_view(order, seller_id) for order in orders]
     paginated_response = paginate(
-        transform_mongo_data(orders), page=page, page_size=page_size
+        select_fields(transform_mongo_data(orders), fields),
+        page=page,
+        page_size=page_size,
     )
     return paginated_response
 
@@ -77,6 +144,7 @@ async def get_my_orders(
 @router.post("/", response_model=List[OrderItemDetail])
 async def create_order(
     payload: OrderCreateSchema,
+    key: Optional[str] = Depends(idempotency_key),
     current_user=Depends(auth_handler.auth_wrapper),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
@@ -85,8 +153,17 @@ async def create_order(
         msg = "Not allowed, contact Administrator"
         raise HTTPException(status_code=403, detail=msg)
 
-    order_item_list = await order_create_job(req_user, payload, db)
-    return order_item_list
+    order_item_list = await run_idempotent(
+        key,
+        scope=f"orders:create:{req_user['_id']}",
+        request_fingerprint=fingerprint(payload),
+        compute=lambda: order_create_job(req_user, payload, db),
+        db=db,
+    )
+    if isinstance(order_item_list, Response):
+        # Replayed from the first request with this Idempotency-Key.
+        return order_item_list
+    return json_response(OrderItemDetailListAdapter, order_item_list)
 
 
 @router.patch("")
@@ -100,35 +177,31 @@ async def update_order(
         msg = "Not allowed, contact Administrator"
         raise HTTPException(status_code=403, detail=msg)
 
-    order = payload.dict()
-    existing_order = await db["orders"].find_one({"_id": PyObjectId(order["id"])})
-
-    if not existing_order:
-        msg = "Order does not exist."
-        raise HTTPException(status_code=403, detail=msg)
-
-    if (
-        hasRetailerPermission(req_user)
-        and not req_user["_id"] == existing_order["buyer_id"]
-    ):
-        msg = "Not allowed, contact Administrator"
-        raise HTTPException(status_code=403, detail=msg)
-
+    order = payload.model_dump()
     order_list = []
-    order_item_list = await order_update_job(order, order_list, order["items"], db)
-    await db["orders"].update_one(
-        {"_id": PyObjectId(order["id"])},
-        {
-            "$set": {
-                "items": order_item_list,
-                "updated_at": datetime.now(),
-                "total_price": sum([item["subtotal"] for item in order_item_list]),
-            }
-        },
-    )
+    await order_update_job(order, order_list, order["items"], req_user, db)
     return {"details": "Order Updated successfully"}
 
 
+@router.patch("/{id}/status")
+async def update_order_status(
+    id: str,
+    payload: OrderStatusUpdateSchema,
+    current_user=Depends(auth_handler.auth_wrapper),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """
+    Move an order through pending -> confirmed -> completed, or cancel it.
+    Returns 409 if the order is no longer in a status (or at the ``version``)
+    the transition applies to.
+    """
+    req_user = await get_current_user(current_user, db)
+    order = await transition_order(db, id, payload.status, req_user, payload.version)
+    if hasWholeSalerPermission(req_user):
+        order = seller_view(order, str(req_user["_id"]))
+    return transform_mongo_data(order)
+
+
 @router.delete("/{id}")
 async def delete_order(
     id: str,
@@ -1,8 +1,7 @@
 from enum import Enum
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from datetime import datetime
-from bson import ObjectId
 
 from app.core._id import PyObjectId
 
@@ -22,6 +21,7 @@ class OrderItem(BaseModel):
 class OrderItemDetail(BaseModel):
     order_id: str
     product_id: str
+    seller_id: Optional[str] = None
     product_description: str
     product_name: str
     price: float
@@ -30,8 +30,11 @@ class OrderItemDetail(BaseModel):
 
 
 class OrderDetailSchema(BaseModel):
-    id: Optional[str] = Field(default_factory=PyObjectId, alias="_id")
+    id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
     buyer_id: str = Field(..., description="The Retailer who placed the order")
+    seller_ids: List[str] = Field(
+        default_factory=list, description="Wholesalers whose products are ordered"
+    )
     items: List[OrderItemDetail]
     total_price: float
     status: OrderStatus = OrderStatus.PENDING
@@ -46,3 +49,16 @@ class OrderCreateSchema(BaseModel):
 class OrderUpdateSchema(BaseModel):
     id: str
     items: List[OrderItem]
+    version: Optional[int] = Field(
+        None, description="Only update if the order is still at this version"
+    )
+
+
+class OrderStatusUpdateSchema(BaseModel):
+    status: OrderStatus
+    version: Optional[int] = Field(
+        None, description="Only update if the order is still at this version"
+    )
+
+
+OrderItemDetailListAdapter = TypeAdapter(List[OrderItemDetail])
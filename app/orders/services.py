@@ -1,30 +1,57 @@
 from datetime import datetime
 
+from bson import ObjectId
 from fastapi import HTTPException
 
+from app.accounts.permissions import (
+    hasAdminPermission,
+    hasRetailerPermission,
+    hasWholeSalerPermission,
+)
 from app.core._id import PyObjectId
+from app.core.helpers import parse_object_ids
+from app.core.writes import update_document
 from app.orders.schemas import OrderStatus
+from app.orders.tasks import ARCHIVE_COLLECTION
 
 
-async def initiate_order(req_user, payload, db):
+async def initiate_order(req_user, order_id, order_item_list, db):
     order_data = {
+        "_id": order_id,
         "buyer_id": req_user["_id"],
-        "items": [],
+        "seller_ids": get_seller_ids(order_item_list),
+        "items": order_item_list,
         "created_at": datetime.now(),
         "updated_at": datetime.now(),
         "status": OrderStatus.PENDING,
-        "total_price": 0.0,
+        "total_price": sum([item["subtotal"] for item in order_item_list]),
+        "version": 1,
     }
     order = await db["orders"].insert_one(order_data)
     return order
 
 
+def get_seller_ids(order_item_list):
+    return sorted({item["seller_id"] for item in order_item_list})
+
+
 async def build_order_item_list(order_id, order_item_list, order_items, db):
+    product_ids, _ = parse_object_ids([item["product_id"] for item in order_items])
+    products = (
+        await db["products"].find({"_id": {"$in": product_ids}}).to_list(length=None)
+    )
+    products = {str(product["_id"]): product for product in products}
+
     for item in order_items:
-        product = await db["products"].find_one({"_id": PyObjectId(item["product_id"])})
+        product = products.get(item["product_id"])
+        if not product:
+            msg = f"Product {item['product_id']} does not exist."
+            raise HTTPException(status_code=400, detail=msg)
+
         item_info = {
             "order_id": str(order_id),
             "product_id": item["product_id"],
+            "seller_id": str(product["seller_id"]),
             "product_name": product["name"],
             "product_description": product["description"],
             "price": float(product["price_per_unit"]),
@@ -37,31 +64,145 @@ async def build_order_item_list(order_id, order_item_list, order_items, db):
 
 async def order_create_job(req_user, payload: dict, db) -> list:
     try:
-        order_items = payload.dict()["items"]
+        order_items = payload.model_dump()["items"]
         order_item_list = []
-        order = await initiate_order(req_user, payload, db)
-        order_id = order.inserted_id
+        # The ID is generated up front so the order and its items can be
+        # written in a single insert.
+        order_id = ObjectId()
         order_item_list = await build_order_item_list(
             order_id, order_item_list, order_items, db
         )
-
-        await db["orders"].update_one(
-            {"_id": PyObjectId(order.inserted_id)},
-            {
-                "$push": {"items": {"$each": [item for item in order_item_list]}},
-                "$set": {
-                    "updated_at": datetime.now(),
-                    "total_price": sum([item["subtotal"] for item in order_item_list]),
-                },
-            },
-        )
+        await initiate_order(req_user, order_id, order_item_list, db)
         return order_item_list
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(f"Something went wrong: {e}")
+        raise HTTPException(status_code=500, detail=f"Something went wrong: {e}")
+
+
+# target status -> statuses an order may move to it from
+ORDER_TRANSITIONS = {
+    OrderStatus.CONFIRMED: [OrderStatus.PENDING],
+    OrderStatus.COMPLETED: [OrderStatus.CONFIRMED],
+    OrderStatus.CANCELLED: [OrderStatus.PENDING, OrderStatus.CONFIRMED],
+}
+
+
+def transition_filter(req_user, target):
+    """
+    The ownership and current-status conditions for moving an order to
+    ``target`` as ``req_user``. Sellers confirm, complete and cancel orders
+    containing their products; buyers can only cancel their own orders
+    while they are still pending; admins can do anything.
+    """
+    if target not in ORDER_TRANSITIONS:
+        raise HTTPException(status_code=400, detail=f"Orders can't become {target}.")
+
+    sources = ORDER_TRANSITIONS[target]
+    if hasAdminPermission(req_user):
+        ownership = {}
+    elif hasWholeSalerPermission(req_user):
+        ownership = {"seller_ids": str(req_user["_id"])}
+    elif hasRetailerPermission(req_user) and target == OrderStatus.CANCELLED:
+        ownership = {"buyer_id": req_user["_id"]}
+        sources = [OrderStatus.PENDING]
+    else:
+        raise HTTPException(status_code=403, detail="Not allowed.")
+    return {**ownership, "status": {"$in": sources}}
+
+
+async def update_order_if(db, order_id, conditions, update, version=None):
+    """
+    Apply ``update`` in a single ``find_one_and_update`` whose filter holds
+    ``conditions`` (and ``version`` when given) and bump the order's version.
+    When nothing matches, one more read tells a missing order (404) from one
+    the user doesn't own (403) and one that has moved on (409).
+    """
+    query = {"_id": PyObjectId(order_id), **conditions}
+    if version is not None:
+        query["version"] = version
+
+    order = await update_document(db["orders"], query, update)
+    if order is not None:
+        return order
+
+    ownership = {k: v for k, v in conditions.items() if k in ("buyer_id", "seller_ids")}
+    current = await db["orders"].find_one(
+        {"_id": query["_id"]},
+        {"status": 1, "version": 1, **dict.fromkeys(ownership, 1)},
+    )
+    if current is None:
+        raise HTTPException(status_code=404, detail="Order does not exist.")
+    for field, value in ownership.items():
+        owned = current.get(field)
+        if not (value in owned if isinstance(owned, list) else value == owned):
+            msg = "Not allowed, contact Administrator"
+            raise HTTPException(status_code=403, detail=msg)
+    msg = (
+        f"Order is {current['status']} at version {current.get('version')}; "
+        "reload it and try again."
+    )
+    raise HTTPException(status_code=409, detail=msg)
+
+
+async def transition_order(db, order_id, target, req_user, version=None):
+    return await update_order_if(
+        db,
+        order_id,
+        transition_filter(req_user, target),
+        {"$set": {"status": target}},
+        version,
+    )
 
 
-async def order_update_job(order, order_list, order_items, db):
+async def order_update_job(order, order_list, order_items, req_user, db):
+    """
+    Replace a pending order's items. The buyer and status checks are part of
+    the update's filter, so nothing can change the order in between.
+    """
     order_item_list = await build_order_item_list(
         order["id"], order_list, order_items, db
     )
+    await update_order_if(
+        db,
+        order["id"],
+        {"buyer_id": req_user["_id"], "status": OrderStatus.PENDING},
+        {
+            "$set": {
+                "items": order_item_list,
+                "seller_ids": get_seller_ids(order_item_list),
+                "total_price": sum([item["subtotal"] for item in order_item_list]),
+            }
+        },
+        order.get("version"),
+    )
     return order_item_list
+
+
+def seller_view(order, seller_id):
+    """
+    Restrict an order to one seller's items and their total, for wholesalers
+    looking at orders that also contain other sellers' products.
+    """
+    if "items" in order:
+        order["items"] = [
+            item for item in order["items"] if item.get("seller_id") == seller_id
+        ]
+        order["seller_total"] = sum(item["subtotal"] for item in order["items"])
+    return order
+
+
+async def find_order(db, order_id, include_archived=False, projection=None):
+    query = {"_id": PyObjectId(order_id)}
+    order = await db["orders"].find_one(query, projection)
+    if order is None and include_archived:
+        order = await db[ARCHIVE_COLLECTION].find_one(query, projection)
+    return order
+
+
+async def find_orders(db, query, projection=None, include_archived=False):
+    orders = await db["orders"].find(query, projection).to_list(length=None)
+    if include_archived:
+        archived = db[ARCHIVE_COLLECTION].find(query, projection)
+        orders += await archived.to_list(length=None)
+    return orders
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from pymongo import ReplaceOne
+
+from app.core import settings
+from app.core.database import get_database
+from app.orders.schemas import OrderStatus
+
+ARCHIVE_COLLECTION = "orders_archive"
+ARCHIVABLE_STATUSES = [OrderStatus.COMPLETED, OrderStatus.CANCELLED]
+
+
+async def archive_orders(db, older_than_days=None, batch_size=None):
+    """
+    Move completed and cancelled orders that haven't changed for
+    ``older_than_days`` from ``orders`` to ``orders_archive`` in batches.
+
+    Each batch is upserted into the archive before it is deleted from the hot
+    collection, so an interrupted run never loses an order and re-running it
+    is safe. Returns the number of orders archived.
+    """
+    older_than_days = older_than_days or settings.ORDER_ARCHIVE_AFTER_DAYS
+    batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+    query = {
+        "status": {"$in": ARCHIVABLE_STATUSES},
+        "updated_at": {"$lt": datetime.now() - timedelta(days=older_than_days)},
+    }
+
+    archived = 0
+    while True:
+        batch = await db["orders"].find(query).to_list(length=batch_size)
+        if not batch:
+            return archived
+
+        await db[ARCHIVE_COLLECTION].bulk_write(
+            [ReplaceOne({"_id": order["_id"]}, order, upsert=True) for order in batch],
+            ordered=False,
+        )
+        ids = [order["_id"] for order in batch]
+        await db["orders"].delete_many({"_id": {"$in": ids}, **query})
+        archived += len(batch)
+
+
+async def run_order_archival():
+    """Background loop started from the app lifespan."""
+    while True:
+        try:
+            archived = await archive_orders(get_database())
+            if archived:
+                print(f"Archived {archived} orders")
+        except Exception as e:
+            print(f"Order archival failed: {e}")
+        await asyncio.sleep(settings.ORDER_ARCHIVE_INTERVAL_SECONDS)
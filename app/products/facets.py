@@ -0,0 +1,109 @@
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from app.core import settings
+
+FACET_FIELDS = ("category", "status")
+FACETS_PIPELINE = [
+    {
+        "$facet": {
+            **{
+                field: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+                for field in FACET_FIELDS
+            },
+            "total": [{"$count": "count"}],
+        }
+    }
+]
+
+
+class ProductFacets:
+    """
+    In-memory per-category and per-status product counts.
+
+    Counts are loaded with one ``$facet`` aggregation and then kept current
+    by the product write paths calling ``added``, ``changed`` and
+    ``removed``. Other processes' writes aren't seen, so the counts are also
+    reloaded every ``FACETS_CACHE_TTL_SECONDS``.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self._ttl = ttl
+        self._counts: Optional[Dict[str, Any]] = None
+        self._loaded_at = 0.0
+        self._writes = 0
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else settings.FACETS_CACHE_TTL_SECONDS
+
+    def _is_fresh(self):
+        return (
+            self._counts is not None and time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    async def get(self, db):
+        if not self._is_fresh():
+            writes = self._writes
+            counts = await self.load(db)
+            # A write that landed while the aggregation ran may or may not be
+            # in it; don't cache a result that could be off by one.
+            if writes != self._writes:
+                return self._as_response(counts)
+            self._counts, self._loaded_at = counts, time.monotonic()
+        return self._as_response(self._counts)
+
+    async def load(self, db):
+        result = await db["products"].aggregate(FACETS_PIPELINE).to_list(length=1)
+        groups = result[0] if result else {}
+        counts = {
+            field: Counter(
+                {
+                    group["_id"]: group["count"]
+                    for group in groups.get(field, [])
+                    if group["_id"] is not None
+                }
+            )
+            for field in FACET_FIELDS
+        }
+        total = groups.get("total") or [{"count": 0}]
+        counts["total"] = total[0]["count"]
+        return counts
+
+    def _as_response(self, counts):
+        return {
+            **{field: dict(counts[field]) for field in FACET_FIELDS},
+            "total": counts["total"],
+        }
+
+    def _apply(self, product, delta):
+        self._writes += 1
+        if self._counts is None:
+            return
+        self._counts["total"] += delta
+        for field in FACET_FIELDS:
+            value = product.get(field)
+            if value is None:
+                continue
+            value = getattr(value, "value", value)
+            self._counts[field][value] += delta
+            if self._counts[field][value] <= 0:
+                del self._counts[field][value]
+
+    def added(self, product):
+        self._apply(product, 1)
+
+    def removed(self, product):
+        self._apply(product, -1)
+
+    def changed(self, before, after):
+        self.removed(before)
+        self.added(after)
+
+    def invalidate(self):
+        self._writes += 1
+        self._counts = None
+
+
+product_facets = ProductFacets()
@@ -1,65 +1,144 @@
-import uuid
-import shutil
-from datetime import datetime
-from typing import Optional
-
-import cloudinary
-import cloudinary.uploader
-from cloudinary.utils import cloudinary_url
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+import json
+from typing import List, Optional
+
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from app.accounts.permissions import (
-    hasAdminPermission,
     hasCreateProductPermission,
     hasWholeSalerPermission,
 )
 from app.accounts.services import get_current_user
 from app.products.schemas import (
+    ProductBulkUpdateItem,
+    ProductBulkUpdateResponseSchema,
     ProductCreateSchema,
     ProductDetailSchema,
     ProductImageSchema,
+    ProductImportResponseSchema,
     ProductCategory,
     ProductStatus,
+    ProductUpdateSchema,
+)
+from app.products.services import (
+    BULK_UPDATE_MAX_ROWS,
+    IMPORT_CONTENT_TYPES,
+    PRODUCT_LIST_FIELDS,
+    add_product_image,
+    bulk_update_products,
+    get_products_by_ids,
+    get_products_response,
+    import_products,
+    iter_csv_rows,
+    iter_ndjson_rows,
+    delete_product_document,
+    product_images_stages,
+    update_product_fields,
 )
-from app.products.services import get_products_response
+from app.products.facets import product_facets
 from app.core.auth import AuthHandler
 from app.core._id import PyObjectId
+from app.core.conditional import (
+    VERSION_FIELDS,
+    check_not_modified,
+    collection_etag,
+    document_etag,
+    is_conditional,
+    last_modified,
+    page_versions_stage,
+    set_validators,
+)
 from app.core.database import get_database
+from app.core.fieldsets import parse_fields, select_fields
+from app.core.geo import MAX_NEAR_RADIUS_METRES, geo_near_stage, parse_near
 from app.core.helpers import transform_mongo_data
+from app.core.http_client import HttpClient, get_http_client
+from app.core.idempotency import fingerprint, idempotency_key, run_idempotent
 from app.core.pagination import paginate
-from app.core import settings
+from app.core.singleflight import single_flight
+from app.core.writes import insert_document, update_document, versioned
 
 ERROR_CODE = status.HTTP_404_NOT_FOUND
 auth_handler = AuthHandler()
 router = APIRouter(prefix="/products", tags=["Products"])
 
-cloudinary.config(
-    cloud_name=settings.CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET,
-)
+
+# Declared before "/{id}" so the path isn't taken for a product ID.
+@router.get("/facets")
+async def get_product_facets(db: AsyncIOMotorDatabase = Depends(get_database)):
+    """Product counts per category and per status."""
+    return await product_facets.get(db)
 
 
 @router.get("/{id}")
 async def get_single_product(
     id: str,
+    request: Request,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
-    product = await db["products"].find_one({"_id": PyObjectId(id)})
+    product_id = PyObjectId(id)
+    # Identical concurrent reads share one query; see app/core/singleflight.py.
+    if is_conditional(request):
+        current = await single_flight.do(
+            "products.version",
+            product_id,
+            lambda: db["products"].find_one({"_id": product_id}, VERSION_FIELDS),
+        )
+        if not current:
+            raise HTTPException(status_code=ERROR_CODE, detail="Product not found.")
+        cached = check_not_modified(
+            request, document_etag(current), current.get("updated_at")
+        )
+        if cached:
+            return cached
+
+    product = await single_flight.do(
+        "products.get",
+        product_id,
+        lambda: db["products"].find_one({"_id": product_id}),
+    )
+    if not product:
+        raise HTTPException(status_code=ERROR_CODE, detail="Product not found.")
+
+    set_validators(response, document_etag(product), product.get("updated_at"))
     product = transform_mongo_data(product)
     return product
 
 
 @router.get("")
 async def get_products(
+    request: Request,
+    response: Response,
     category: Optional[ProductCategory] = None,
     status: Optional[ProductStatus] = None,
+    ids: Optional[str] = Query(None, description="Comma-separated product IDs"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields"),
+    facets: bool = Query(False, description="Add catalog-wide counts to meta"),
+    near: Optional[str] = Query(None, description="latitude,longitude"),
+    radius: float = Query(
+        10_000, gt=0, le=MAX_NEAR_RADIUS_METRES, description="Metres from `near`"
+    ),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
+    fields = parse_fields(fields, PRODUCT_LIST_FIELDS)
+    if ids is not None:
+        return await get_products_by_ids(ids.split(","), db, fields)
+
     product_status = (
         {"$in": ["available"]}
         if status == "available"
@@ -75,21 +154,51 @@ async def get_products(
         else {"status": product_status}
     )
 
-    pipeline = [
-        {"$match": query},
-        {
-            "$lookup": {
-                "from": "product_images",
-                "localField": "_id",
-                "foreignField": "product_id",
-                "as": "images",
-            }
-        },
-    ]
-    products_with_images = await db["products"].aggregate(pipeline).to_list(length=None)
-    paginated_response = paginate(
-        transform_mongo_data(products_with_images), page=page, page_size=page_size
+    # Both the version check and the full query use the same order (_id, or
+    # distance for ?near=) so that they paginate the same way.
+    if near is not None:
+        match_stages = [geo_near_stage(parse_near(near), radius, query)]
+    else:
+        match_stages = [{"$match": query}, {"$sort": {"_id": 1}}]
+
+    # meta.facets counts the whole catalog, so a write on another page changes
+    # the response too: the counts go into the ETag, and there's no page-level
+    # Last-Modified to vouch for them.
+    facet_counts = await product_facets.get(db) if facets else None
+    etag_parts = [request.url.query]
+    if facet_counts is not None:
+        etag_parts.append(json.dumps(facet_counts, sort_keys=True))
+
+    if is_conditional(request):
+        version_pipeline = [*match_stages, page_versions_stage(page, page_size)]
+        (versions,) = await single_flight.do(
+            "products.list_versions",
+            repr(version_pipeline),
+            lambda: db["products"].aggregate(version_pipeline).to_list(length=1),
+        )
+        total = versions["total"][0]["count"] if versions["total"] else 0
+        etag = collection_etag(versions["items"], *etag_parts, total)
+        modified_at = None if facets else last_modified(versions["items"])
+        cached = check_not_modified(request, etag, modified_at)
+        if cached:
+            return cached
+
+    pipeline = [*match_stages, *product_images_stages(fields)]
+    products_with_images = await single_flight.do(
+        "products.list",
+        repr(pipeline),
+        lambda: db["products"].aggregate(pipeline).to_list(length=None),
     )
+    paginated_response = paginate(products_with_images, page=page, page_size=page_size)
+
+    items = paginated_response["items"]
+    etag = collection_etag(
+        items, *etag_parts, paginated_response["meta"]["total_items"]
+    )
+    set_validators(response, etag, None if facets else last_modified(items))
+    paginated_response["items"] = select_fields(transform_mongo_data(items), fields)
+    if facets:
+        paginated_response["meta"]["facets"] = facet_counts
     return paginated_response
 
 
@@ -99,16 +208,63 @@ async def create_product(
     current_user=Depends(auth_handler.auth_wrapper),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
-    product_in_db = await db["products"].find_one(
-        {
-            "name": product.name,
-            "description": product.description,
-            "seller_id": product.seller_id,
-        }
-    )
-    if product_in_db:
+    req_user = await get_current_user(current_user, db)
+    if not hasCreateProductPermission(req_user):
+        raise HTTPException(
+            status_code=403,
+            detail="Only wholesalers or admins can perform this action.",
+        )
+
+    new_product = versioned(product.model_dump(by_alias=True))
+    if new_product["location"] is None and product.seller_id == str(req_user["_id"]):
+        new_product["location"] = req_user.get("location")
+    try:
+        # The unique (seller_id, name, description) index, built before the
+        # app starts serving, rejects duplicates.
+        created_product = await insert_document(db["products"], new_product)
+    except DuplicateKeyError:
         raise HTTPException(status_code=403, detail="Product already exists.")
+    product_facets.added(created_product)
+    return transform_mongo_data(created_product)
+
+
+@router.post("/import", response_model=ProductImportResponseSchema)
+async def import_products_route(
+    request: Request,
+    current_user=Depends(auth_handler.auth_wrapper),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """
+    Bulk-create products from a CSV (``text/csv``, header row required) or
+    NDJSON (``application/x-ndjson``) request body, streamed row by row.
+    """
+    req_user = await get_current_user(current_user, db)
+    if not hasCreateProductPermission(req_user):
+        raise HTTPException(
+            status_code=403,
+            detail="Only wholesalers or admins can perform this action.",
+        )
 
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    import_format = IMPORT_CONTENT_TYPES.get(content_type)
+    if import_format is None:
+        msg = f"Unsupported content type. Use one of: {', '.join(IMPORT_CONTENT_TYPES)}"
+        raise HTTPException(status_code=415, detail=msg)
+
+    rows = (
+        iter_csv_rows(request.stream())
+        if import_format == "csv"
+        else iter_ndjson_rows(request.stream())
+    )
+    return await import_products(rows, req_user, db)
+
+
+@router.patch("/bulk", response_model=ProductBulkUpdateResponseSchema)
+async def bulk_update_products_route(
+    rows: List[ProductBulkUpdateItem] = Body(..., max_length=BULK_UPDATE_MAX_ROWS),
+    current_user=Depends(auth_handler.auth_wrapper),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
     req_user = await get_current_user(current_user, db)
     if not hasCreateProductPermission(req_user):
         raise HTTPException(
@@ -116,81 +272,48 @@ async def create_product(
             detail="Only wholesalers or admins can perform this action.",
         )
 
-    new_product = await db["products"].insert_one(product.dict(by_alias=True))
-    created_product = await db["products"].find_one({"_id": new_product.inserted_id})
-    created_product = transform_mongo_data(created_product)
-    return created_product
+    return await bulk_update_products(rows, req_user, db)
 
 
 @router.patch("/{id}", response_model=ProductDetailSchema)
 async def update_product(
     id: str,
-    product: ProductCreateSchema,
+    product: ProductUpdateSchema,
     current_user=Depends(auth_handler.auth_wrapper),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
-    product_in_db = await db["products"].find_one({"_id": PyObjectId(id)})
-    if not product_in_db:
-        raise HTTPException(status_code=403, detail="Product not found.")
-
     req_user = await get_current_user(current_user, db)
-    if not (
-        hasAdminPermission(req_user) or req_user["_id"] == product_in_db["seller_id"]
-    ):
-        msg = "Only admins or product owner can perform this action."
-        raise HTTPException(status_code=403, detail=msg)
+    updated_product = await update_product_fields(id, product, req_user, db)
+    return transform_mongo_data(updated_product)
 
-    new_product = await db["products"].insert_one(product.dict(by_alias=True))
-    created_product = await db["products"].find_one({"_id": new_product.inserted_id})
-    created_product = transform_mongo_data(created_product)
-    return created_product
+
+@router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_product(
+    id: str,
+    current_user=Depends(auth_handler.auth_wrapper),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    req_user = await get_current_user(current_user, db)
+    await delete_product_document(id, req_user, db)
 
 
 @router.post("/{id}/images/", response_model=ProductImageSchema)
 async def upload_product_image(
     id: str,
     file: UploadFile = File(...),
+    key: Optional[str] = Depends(idempotency_key),
     current_user=Depends(auth_handler.auth_wrapper),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    http: HttpClient = Depends(get_http_client),
 ):
-    product = await db["products"].find_one({"_id": PyObjectId(id)})
     req_user = await get_current_user(current_user, db)
-    if not hasCreateProductPermission(req_user):
-        raise HTTPException(status_code=400, detail="Not allowed, contact admin")
-
-    if (
-        hasWholeSalerPermission(req_user)
-        and not req_user["_id"] == product["seller_id"]
-    ):
-        raise HTTPException(status_code=400, detail="Not allowed, contact admin")
-
-    if file.content_type not in ["image/jpeg", "image/png", "image/webp"]:
-        raise HTTPException(
-            status_code=400, detail="Invalid file type. Only JPEG and PNG are allowed."
-        )
-
-    alt_text = f"{file.filename.split('.')[0]}.{file.filename.split('.')[-1]}"
-    file_name = f"{uuid.uuid4()}"
-    res = cloudinary.uploader.upload(file.file, public_id=file_name)
-    image_url = res.get("url")
-
-    image = await db["product_images"].insert_one(
-        {
-            "product_id": product["_id"],
-            "url": image_url,
-            "alt_text": alt_text,
-            "created_at": datetime.now(),
-        }
-    )
-    new_image = await db["product_images"].find_one({"_id": image.inserted_id})
-    new_image = transform_mongo_data(new_image)
-
-    await db["products"].find_one_and_update(
-        {"_id": PyObjectId(id)},
-        {"$push": {"images": new_image}},
-        return_document=ReturnDocument.AFTER,
+    return await run_idempotent(
+        key,
+        scope=f"products:images:{req_user['_id']}",
+        request_fingerprint=fingerprint(id, file.filename, file.size),
+        compute=lambda: add_product_image(id, file, req_user, db, http),
+        db=db,
     )
-    return new_image
 
 
 @router.delete("/{id}/images")
@@ -211,4 +334,7 @@ async def delete_product_image(
     ):
         raise HTTPException(status_code=400, detail="Not allowed, contact admin")
 
-    db["product_images"].delete_one({"_id": PyObjectId(image_id)})
+    await db["product_images"].delete_one({"_id": PyObjectId(image_id)})
+    await update_document(
+        db["products"], {"_id": PyObjectId(id)}, {"$pull": {"images": {"id": image_id}}}
+    )
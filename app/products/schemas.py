@@ -1,8 +1,10 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
+
+from app.core.geo import GeoPoint
 
 
 class ProductStatus(str, Enum):
@@ -37,10 +39,28 @@ class ProductCreateSchema(BaseModel):
     stock_quantity: str
     seller_id: str
     is_available: bool = True
+    status: ProductStatus = ProductStatus.AVAILABLE
+    location: Optional[GeoPoint] = Field(
+        None, description="Pickup point; defaults to the seller's location"
+    )
     created_at: datetime = datetime.now()
 
 
+class ProductUpdateSchema(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    category: Optional[str] = None
+    unit: Optional[str] = None
+    price_per_unit: Optional[float] = None
+    stock_quantity: Optional[str] = None
+    is_available: Optional[bool] = None
+    status: Optional[ProductStatus] = None
+    location: Optional[GeoPoint] = None
+
+
 class ProductDetailSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     name: str
     description: str
@@ -50,7 +70,38 @@ class ProductDetailSchema(BaseModel):
     unit: str
     seller_id: str
     is_available: bool
+    status: Optional[ProductStatus] = None
+    location: Optional[GeoPoint] = None
+    distance: Optional[float] = Field(
+        None, description="Metres from the ?near= point, when one was given"
+    )
     created_at: datetime = datetime.now()
 
-    class Config:
-        from_attributes = True
+
+class ProductImportErrorSchema(BaseModel):
+    row: int
+    detail: str
+
+
+class ProductImportResponseSchema(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[ProductImportErrorSchema]
+
+
+class ProductBulkUpdateItem(BaseModel):
+    id: str
+    price_per_unit: Optional[float] = None
+    stock_quantity: Optional[str] = None
+    status: Optional[ProductStatus] = None
+
+
+class ProductBulkUpdateErrorSchema(BaseModel):
+    id: str
+    detail: str
+
+
+class ProductBulkUpdateResponseSchema(BaseModel):
+    matched: int
+    modified: int
+    errors: List[ProductBulkUpdateErrorSchema]
@@ -1,3 +1,45 @@
+import codecs
+import csv
+import json
+import uuid
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pydantic import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.accounts.permissions import (
+    hasAdminPermission,
+    hasCreateProductPermission,
+    hasWholeSalerPermission,
+)
+from app.core._id import PyObjectId
+from app.core.conditional import VERSION_FIELDS
+from app.core.fieldsets import allowed_fields, select_fields, to_projection
+from app.core.helpers import (
+    MAX_BATCH_SIZE,
+    order_by_ids,
+    parse_object_ids,
+    transform_mongo_data,
+)
+from app.core.uploads import upload_image
+from app.core.writes import insert_document, update_document
+from app.products.facets import product_facets
+from app.products.schemas import ProductCreateSchema, ProductDetailSchema
+
+PRODUCT_LIST_FIELDS = allowed_fields(ProductDetailSchema, "images")
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+DUPLICATE_KEY_ERROR = 11000
+BULK_UPDATE_MAX_ROWS = 1000
+
+
 def get_products_response(products: list):
     return [
         {
@@ -14,3 +56,309 @@ def get_products_response(products: list):
         }
         for i in products
     ]
+
+
+async def add_product_image(id, file, req_user, db, http):
+    if not hasCreateProductPermission(req_user):
+        raise HTTPException(status_code=400, detail="Not allowed, contact admin")
+
+    # Checked before the upload so nothing is sent to Cloudinary for a
+    # product the user can't change.
+    query = {"_id": PyObjectId(id)}
+    if hasWholeSalerPermission(req_user):
+        query["seller_id"] = str(req_user["_id"])
+    if not await db["products"].find_one(query, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="Not allowed, contact admin")
+
+    if file.content_type not in ["image/jpeg", "image/png", "image/webp"]:
+        raise HTTPException(
+            status_code=400, detail="Invalid file type. Only JPEG and PNG are allowed."
+        )
+
+    alt_text = f"{file.filename.split('.')[0]}.{file.filename.split('.')[-1]}"
+    file_name = f"{uuid.uuid4()}"
+    res = await upload_image(http, file, public_id=file_name)
+    image_url = res.get("url")
+
+    new_image = await insert_document(
+        db["product_images"],
+        {
+            "product_id": query["_id"],
+            "url": image_url,
+            "alt_text": alt_text,
+            "created_at": datetime.now(),
+        },
+    )
+    new_image = transform_mongo_data(new_image)
+    await update_document(db["products"], query, {"$push": {"images": new_image}})
+    return new_image
+
+
+def product_images_stages(fields=None):
+    """
+    Pipeline stages that project a fieldset and join the product's images.
+    The join is skipped entirely when the fieldset doesn't ask for images.
+    """
+    stages = []
+    projection = to_projection(fields)
+    if projection:
+        # Versions are kept for ETags; select_fields drops them afterwards.
+        stages.append({"$project": {**projection, **VERSION_FIELDS}})
+    if fields is None or "images" in fields:
+        stages.append(
+            {
+                "$lookup": {
+                    "from": "product_images",
+                    "localField": "_id",
+                    "foreignField": "product_id",
+                    "as": "images",
+                }
+            }
+        )
+    return stages
+
+
+async def get_products_by_ids(ids, db, fields=None):
+    if len(ids) > MAX_BATCH_SIZE:
+        msg = f"A maximum of {MAX_BATCH_SIZE} IDs can be requested at once."
+        raise HTTPException(status_code=400, detail=msg)
+
+    object_ids, invalid = parse_object_ids(ids)
+    pipeline = [
+        {"$match": {"_id": {"$in": object_ids}}},
+        *product_images_stages(fields),
+    ]
+    products = await db["products"].aggregate(pipeline).to_list(length=None)
+    products, missing = order_by_ids(products, object_ids)
+    return {
+        "items": select_fields(transform_mongo_data(products), fields),
+        "meta": {"total_items": len(products), "missing": invalid + missing},
+    }
+
+
+async def iter_lines(stream):
+    """Decode a byte stream into lines without buffering the whole body."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_csv_rows(stream):
+    """
+    Yield ``(line_number, row)`` for each CSV record. Records whose quoted
+    fields span several lines are accumulated until their quotes balance.
+    """
+    header, record, start = None, "", 0
+    line_number = 0
+    async for line in iter_lines(stream):
+        line_number += 1
+        if not record:
+            start = line_number
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        values, record = next(csv.reader([record])), ""
+        if header is None:
+            header = [value.strip() for value in values]
+        elif any(values):
+            yield start, dict(zip(header, values))
+
+
+async def iter_ndjson_rows(stream):
+    line_number = 0
+    async for line in iter_lines(stream):
+        line_number += 1
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, e
+
+
+def validate_import_row(row, req_user):
+    if isinstance(row, Exception):
+        return None, f"Invalid JSON: {row}"
+    if not isinstance(row, dict):
+        return None, "Each line must be a JSON object."
+
+    row.setdefault("seller_id", str(req_user["_id"]))
+    if not hasAdminPermission(req_user) and row["seller_id"] != str(req_user["_id"]):
+        return None, "Products can only be imported for your own account."
+    try:
+        document = ProductCreateSchema(**row).model_dump(by_alias=True)
+        document.update(updated_at=datetime.now(), version=1)
+        return document, None
+    except ValidationError as e:
+        errors = [
+            f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+        ]
+        return None, "; ".join(errors)
+
+
+async def insert_import_chunk(chunk, db, errors):
+    """
+    Insert one chunk of validated rows, unordered so a bad row doesn't stop
+    the rest. Duplicates are rejected by the unique seller/name/description
+    index rather than a lookup per row.
+    """
+    documents = [document for _, document in chunk]
+    failed = set()
+    try:
+        await db["products"].insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details["writeErrors"]:
+            detail = (
+                "Product already exists."
+                if error["code"] == DUPLICATE_KEY_ERROR
+                else error["errmsg"]
+            )
+            errors.append({"row": chunk[error["index"]][0], "detail": detail})
+            failed.add(error["index"])
+
+    for index, document in enumerate(documents):
+        if index not in failed:
+            product_facets.added(document)
+    return len(documents) - len(failed)
+
+
+async def import_products(rows, req_user, db):
+    inserted, errors, chunk = 0, [], []
+    async for row_number, row in rows:
+        document, error = validate_import_row(row, req_user)
+        if error:
+            errors.append({"row": row_number, "detail": error})
+            continue
+        chunk.append((row_number, document))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            inserted += await insert_import_chunk(chunk, db, errors)
+            chunk = []
+    if chunk:
+        inserted += await insert_import_chunk(chunk, db, errors)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
+
+
+async def bulk_update_products(rows, req_user, db):
+    """
+    Apply price/stock/status changes for many products with one ownership
+    query and one unordered ``bulk_write``. Rows for the same product are
+    merged (later rows win) since unordered writes have no defined order.
+    """
+    changes, errors = {}, []
+    for row in rows:
+        fields = row.model_dump(exclude={"id"}, exclude_none=True)
+        if not fields:
+            errors.append({"id": row.id, "detail": "Nothing to update."})
+        elif not ObjectId.is_valid(row.id):
+            errors.append({"id": row.id, "detail": "Invalid product id."})
+        else:
+            changes.setdefault(ObjectId(row.id), {}).update(fields)
+
+    owners = (
+        await db["products"]
+        .find({"_id": {"$in": list(changes)}}, {"seller_id": 1, "status": 1})
+        .to_list(length=None)
+    )
+    current = {product["_id"]: product for product in owners}
+    owners = {product["_id"]: product["seller_id"] for product in owners}
+
+    is_admin = hasAdminPermission(req_user)
+    operations, updated = [], []
+    for product_id, fields in changes.items():
+        if product_id not in owners:
+            errors.append({"id": str(product_id), "detail": "Product not found."})
+            continue
+        query = {"_id": product_id}
+        if not is_admin:
+            if str(owners[product_id]) != str(req_user["_id"]):
+                detail = "Only admins or product owner can perform this action."
+                errors.append({"id": str(product_id), "detail": detail})
+                continue
+            # Keep the ownership condition in the write itself.
+            query["seller_id"] = owners[product_id]
+        fields["updated_at"] = datetime.now()
+        operations.append(UpdateOne(query, {"$set": fields, "$inc": {"version": 1}}))
+        updated.append((current[product_id], fields))
+
+    matched = modified = 0
+    if operations:
+        result = await db["products"].bulk_write(operations, ordered=False)
+        matched, modified = result.matched_count, result.modified_count
+        if matched < len(operations):
+            # Something changed under us, so the status counts are unknown.
+            product_facets.invalidate()
+        else:
+            for before, fields in updated:
+                product_facets.changed(before, {**before, **fields})
+    return {"matched": matched, "modified": modified, "errors": errors}
+
+
+async def raise_not_found_or_forbidden(db, product_id):
+    """After a write with the ownership check in its filter matched nothing."""
+    if await db["products"].find_one({"_id": product_id}, {"_id": 1}):
+        msg = "Only admins or product owner can perform this action."
+        raise HTTPException(status_code=403, detail=msg)
+    raise HTTPException(status_code=404, detail="Product not found.")
+
+
+async def update_product_fields(id, changes, req_user, db):
+    """
+    Apply a partial update in one ``find_one_and_update`` with the ownership
+    check in the filter, returning the updated product. Only on a miss is the
+    product read again, to tell "not found" from "not yours".
+    """
+    fields = changes.model_dump(exclude_unset=True, exclude_none=True)
+    if not fields:
+        raise HTTPException(status_code=400, detail="Nothing to update.")
+    if not hasCreateProductPermission(req_user):
+        msg = "Only admins or product owner can perform this action."
+        raise HTTPException(status_code=403, detail=msg)
+
+    query = {"_id": PyObjectId(id)}
+    if not hasAdminPermission(req_user):
+        query["seller_id"] = str(req_user["_id"])
+    # Facet counts need the old category/status, so fetch the document as it
+    # was and apply the same change to it here.
+    fields["updated_at"] = datetime.now()
+    try:
+        product = await update_document(
+            db["products"],
+            query,
+            {"$set": fields},
+            return_document=ReturnDocument.BEFORE,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=403, detail="Product already exists.")
+
+    if product is None:
+        await raise_not_found_or_forbidden(db, query["_id"])
+
+    updated = {**product, **fields, "version": product.get("version", 0) + 1}
+    product_facets.changed(product, updated)
+    return updated
+
+
+async def delete_product_document(id, req_user, db):
+    if not hasCreateProductPermission(req_user):
+        msg = "Only admins or product owner can perform this action."
+        raise HTTPException(status_code=403, detail=msg)
+
+    query = {"_id": PyObjectId(id)}
+    if not hasAdminPermission(req_user):
+        query["seller_id"] = str(req_user["_id"])
+    product = await db["products"].find_one_and_delete(
+        query, projection={"category": 1, "status": 1}
+    )
+    if product is None:
+        await raise_not_found_or_forbidden(db, query["_id"])
+
+    await db["product_images"].delete_many({"product_id": query["_id"]})
+    product_facets.removed(product)
@@ -0,0 +1,133 @@
+"""
+Validation/serialization benchmark for 1k-row list responses.
+
+Compares the previous path (``transform_mongo_data`` over every document,
+then FastAPI's ``response_model`` validation, ``model_dump(mode="json")`` and
+``json.dumps``) with the prebuilt ``TypeAdapter`` path used by the routes.
+
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --rows 5000 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.accounts.schemas import (  # noqa: E402
+    UserInfoListAdapter,
+    UserInfoPaginatedResponseSchema,
+)
+from app.core.helpers import transform_mongo_data  # noqa: E402
+from app.core.serialization import (  # noqa: E402
+    json_response,
+    paginated_json_response,
+)
+from app.orders.schemas import (  # noqa: E402
+    OrderItemDetail,
+    OrderItemDetailListAdapter,
+)
+
+
+def make_users(rows):
+    now = datetime.now()
+    return [
+        {
+            "_id": ObjectId(),
+            "email": f"user{i}@example.com",
+            "password": "$2b$12$" + "x" * 53,
+            "first_name": "Ada",
+            "middle_name": None,
+            "last_name": f"Lovelace {i}",
+            "phone": "+2348000000000",
+            "address": f"{i} Marina Road, Lagos",
+            "is_active": True,
+            "role": "retailer",
+            "created_at": now,
+            "updated_at": now,
+            "version": 1,
+            "mfa_enabled": False,
+        }
+        for i in range(rows)
+    ]
+
+
+def make_order_items(rows):
+    order_id = str(ObjectId())
+    return [
+        {
+            "order_id": order_id,
+            "product_id": str(ObjectId()),
+            "seller_id": str(ObjectId()),
+            "product_name": f"Product {i}",
+            "product_description": "50kg bag",
+            "price": 12.5,
+            "quantity": i % 7 + 1,
+            "subtotal": 12.5 * (i % 7 + 1),
+        }
+        for i in range(rows)
+    ]
+
+
+def page(items):
+    meta = {"page": 1, "page_size": len(items), "total_items": len(items)}
+    return {"items": items, "meta": {**meta, "total_pages": 1}}
+
+
+def dumps(content):
+    # Equivalent of starlette's JSONResponse.render
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    users = make_users(args.rows)
+    items = make_order_items(args.rows)
+    page_adapter = TypeAdapter(UserInfoPaginatedResponseSchema)
+    item_list_adapter = TypeAdapter(list[OrderItemDetail])
+
+    def users_before():
+        content = page_adapter.validate_python(page(transform_mongo_data(users)))
+        return dumps(page_adapter.dump_python(content, mode="json"))
+
+    def users_after():
+        return paginated_json_response(UserInfoListAdapter, page(users)).body
+
+    def items_before():
+        content = item_list_adapter.validate_python(items)
+        return dumps(item_list_adapter.dump_python(content, mode="json"))
+
+    def items_after():
+        return json_response(OrderItemDetailListAdapter, items).body
+
+    assert json.loads(users_before()) == json.loads(users_after())
+    assert json.loads(items_before()) == json.loads(items_after())
+
+    print(f"{args.rows} rows, best of {args.repeat} runs")
+    for name, before, after in [
+        ("users page", users_before, users_after),
+        ("order items", items_before, items_after),
+    ]:
+        t_before = min(timeit.repeat(before, number=1, repeat=args.repeat)) * 1000
+        t_after = min(timeit.repeat(after, number=1, repeat=args.repeat)) * 1000
+        print(
+            f"  {name:12} before {t_before:7.2f} ms  after {t_after:7.2f} ms"
+            f"  ({t_before / t_after:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Startup benchmark: import time of ``app.main`` and time to first request.
+
+Run from the repository root::
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --top 20 --max-import-ms 600
+
+Each measurement runs in a fresh interpreter so nothing is already cached in
+``sys.modules``. The app runs on the in-memory database backend unless
+``DATABASE_BACKEND`` is set, so no mongod is needed. ``--max-import-ms``
+makes the script exit non-zero when the import budget is exceeded, which
+lets CI track regressions.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST_SNIPPET = """
+import time
+t0 = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+t1 = time.perf_counter()
+with TestClient(app) as client:
+    client.get("/")
+t2 = time.perf_counter()
+print(f"{(t1 - t0) * 1000:.1f} {(t2 - t0) * 1000:.1f}")
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("MONGO_DB_URL", "mongodb://localhost:27017")
+    # Startup builds the unique indexes, which needs a database; the memory
+    # backend lets this run without a mongod. Set DATABASE_BACKEND=mongo to
+    # include a real server's index checks in the measurement.
+    env.setdefault("DATABASE_BACKEND", "memory")
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def import_profile(module="app.main"):
+    """Return ``[(cumulative_us, self_us, name)]`` from ``-X importtime``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env=_env(),
+        check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+
+def first_request():
+    """Return ``(import_ms, first_response_ms)`` measured in a fresh process."""
+    proc = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST_SNIPPET],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env=_env(),
+        check=True,
+    )
+    import_ms, response_ms = proc.stdout.splitlines()[-1].split()
+    return float(import_ms), float(response_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        rows = import_profile()
+        totals.append(next(c for c, _, n in rows if n.strip() == "app.main") / 1000)
+    import_ms = statistics.median(totals)
+
+    print(f"import app.main (median of {args.runs}): {import_ms:.1f} ms")
+    print(f"top {args.top} imports by cumulative time (last run):")
+    for cumulative, _, name in sorted(rows, reverse=True)[: args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+
+    samples = [first_request() for _ in range(args.runs)]
+    print(
+        "time to first request (median of {}): {:.1f} ms".format(
+            args.runs, statistics.median(s[1] for s in samples)
+        )
+    )
+
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"FAIL: import time exceeds budget of {args.max_import_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Migration: remove duplicate products so the unique (seller_id, name,
+description) index can be built.
+
+The old ``PUT /products/{id}`` inserted every edit as a new document, so a
+product can exist several times. The most recently written copy (latest
+``updated_at``, then newest ``_id``) holds the seller's current price and
+stock and stays in ``products``; the others are moved to
+``products_duplicates``. Every moved ID is printed.
+
+Run once from the repository root, before deploying the unique index::
+
+    python migrations/dedupe_products.py --dry-run
+    python migrations/dedupe_products.py
+
+Re-running it is safe: copies are upserted before they are deleted.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+from pymongo import ReplaceOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import database  # noqa: E402
+
+COLLECTION = "products"
+DUPLICATES_COLLECTION = "products_duplicates"
+KEY_FIELDS = ("seller_id", "name", "description")
+
+
+async def find_duplicates(db):
+    """``[(kept_id, [moved_ids])]`` for every group sharing ``KEY_FIELDS``."""
+    groups = await (
+        db[COLLECTION]
+        .aggregate(
+            [
+                {"$sort": {"updated_at": -1, "_id": -1}},
+                {
+                    "$group": {
+                        "_id": {field: f"${field}" for field in KEY_FIELDS},
+                        "ids": {"$push": "$_id"},
+                        "count": {"$sum": 1},
+                    }
+                },
+                {"$match": {"count": {"$gt": 1}}},
+            ],
+            allowDiskUse=True,
+        )
+        .to_list(length=None)
+    )
+    return [(group["ids"][0], group["ids"][1:]) for group in groups]
+
+
+async def move_duplicates(db, dry_run=False, log=print):
+    """Move every duplicate but the newest aside. Returns how many moved."""
+    moved = 0
+    for kept_id, duplicate_ids in await find_duplicates(db):
+        log(f"keeping {kept_id}, moving {', '.join(map(str, duplicate_ids))}")
+        moved += len(duplicate_ids)
+        if dry_run:
+            continue
+        documents = (
+            await db[COLLECTION]
+            .find({"_id": {"$in": duplicate_ids}})
+            .to_list(length=None)
+        )
+        await db[DUPLICATES_COLLECTION].bulk_write(
+            [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in documents]
+        )
+        await db[COLLECTION].delete_many({"_id": {"$in": duplicate_ids}})
+    return moved
+
+
+async def main(dry_run):
+    db = database.connect()
+    try:
+        moved = await move_duplicates(db, dry_run)
+        action = "Would move" if dry_run else "Moved"
+        print(f"{action} {moved} duplicate products to {DUPLICATES_COLLECTION}.")
+        if not dry_run:
+            await database.ensure_unique_indexes(db)
+            print("Unique indexes built.")
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args().dry_run))
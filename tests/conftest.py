@@ -0,0 +1,63 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.accounts.services import issue_refresh_token
+from app.core import database, settings
+from app.core.auth import AuthHandler
+from app.core.writes import insert_document, versioned
+from app.main import app
+from app.products.facets import product_facets
+
+
+@pytest.fixture
+def anyio_backend():
+    # Motor and the app's background tasks are asyncio-only.
+    return "asyncio"
+
+
+@pytest.fixture
+def memory_client(monkeypatch):
+    """The app on the in-memory database backend."""
+    monkeypatch.setenv("DATABASE_BACKEND", "memory")
+    monkeypatch.setenv("SECRET_KEY", "test-secret-" + "x" * 64)
+    monkeypatch.setenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+    monkeypatch.setenv("REFRESH_TOKEN_EXPIRE_DAYS", "7")
+    settings._resolve.cache_clear()
+    # Counts cached from another test's database would be wrong here.
+    product_facets.invalidate()
+    with TestClient(app) as client:
+        client.portal.call(database.ensure_indexes, database.db)
+        yield client
+    settings._resolve.cache_clear()
+
+
+@pytest.fixture
+def seed_user(memory_client):
+    """
+    Create a user and return ``(id, refresh_token, auth_headers)``. Inserted
+    directly rather than through /register so tests don't depend on the
+    bcrypt backend.
+    """
+    auth_handler = AuthHandler()
+
+    def seed(email, role, location=None):
+        user = versioned(
+            {
+                "email": email,
+                "password": "unused",
+                "first_name": "Test",
+                "middle_name": None,
+                "last_name": "User",
+                "phone": None,
+                "address": None,
+                "role": role,
+                "is_active": True,
+                "location": location,
+            }
+        )
+        user = memory_client.portal.call(insert_document, database.db["users"], user)
+        refresh_token = issue_refresh_token(user)
+        headers = {"Authorization": f"Bearer {auth_handler.encode_token(email)}"}
+        return str(user["_id"]), refresh_token, headers
+
+    return seed
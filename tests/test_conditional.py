@@ -0,0 +1,90 @@
+import pytest
+
+
+@pytest.fixture
+def products(memory_client, seed_user):
+    seller_id, _, seller = seed_user("seller@example.com", "wholesaler")
+    ids = []
+    for name in ("Rice", "Beans", "Yam"):
+        product = {
+            "name": name,
+            "description": "bag",
+            "category": "grains",
+            "unit": "bag",
+            "price_per_unit": 100.0,
+            "stock_quantity": "10",
+            "seller_id": seller_id,
+        }
+        response = memory_client.post("/api/v1/products", json=product, headers=seller)
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    return ids, seller
+
+
+def get(client, url, etag=None, **params):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get(url, params=params, headers=headers)
+
+
+def test_product_list_revalidates_per_page(memory_client, products):
+    ids, seller = products
+    url = "/api/v1/products"
+    first = get(memory_client, url, page_size=2)
+    etag = first.headers["ETag"]
+
+    assert get(memory_client, url, etag, page_size=2).status_code == 304
+    assert get(memory_client, url, etag, page_size=2, page=2).status_code == 200
+
+    # A change on another page leaves this page's validator alone ...
+    patch = {"price_per_unit": 150.0}
+    memory_client.patch(f"{url}/{ids[2]}", json=patch, headers=seller)
+    assert get(memory_client, url, etag, page_size=2).status_code == 304
+
+    # ... a change on this page doesn't.
+    memory_client.patch(f"{url}/{ids[0]}", json=patch, headers=seller)
+    response = get(memory_client, url, etag, page_size=2)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert (
+        get(memory_client, url, response.headers["ETag"], page_size=2).status_code
+        == 304
+    )
+
+
+def test_product_detail_revalidates(memory_client, products):
+    ids, seller = products
+    url = f"/api/v1/products/{ids[0]}"
+    response = get(memory_client, url)
+    etag = response.headers["ETag"]
+
+    not_modified = get(memory_client, url, etag)
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert (
+        memory_client.get(
+            url, headers={"If-Modified-Since": response.headers["Last-Modified"]}
+        ).status_code
+        == 304
+    )
+
+    memory_client.patch(url, json={"price_per_unit": 150.0}, headers=seller)
+    assert get(memory_client, url, etag).status_code == 200
+
+
+def test_facet_counts_are_part_of_the_list_validator(memory_client, products):
+    ids, seller = products
+    url = "/api/v1/products"
+    response = get(memory_client, url, page_size=1, facets=True)
+    etag = response.headers["ETag"]
+    assert "Last-Modified" not in response.headers
+    assert get(memory_client, url, etag, page_size=1, facets=True).status_code == 304
+
+    # Only a product on another page changes, but the catalog counts do.
+    patch = {"status": "unavailable"}
+    memory_client.patch(f"{url}/{ids[2]}", json=patch, headers=seller)
+    response = get(memory_client, url, etag, page_size=1, facets=True)
+    assert response.status_code == 200
+    assert response.json()["meta"]["facets"]["status"] == {
+        "available": 2,
+        "unavailable": 1,
+    }
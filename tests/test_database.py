@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.core import database, settings
+from app.core.memory_db import MemoryClient
+from migrations.dedupe_products import move_duplicates
+
+
+def product(name, **extra):
+    return {"seller_id": "s1", "name": name, "description": "bag", **extra}
+
+
+@pytest.mark.anyio
+async def test_duplicate_products_fail_startup_until_migrated():
+    db = MemoryClient()["test"]
+    await db["products"].insert_many([product("Rice"), product("Rice")])
+
+    with pytest.raises(RuntimeError, match="dedupe_products"):
+        await database.ensure_unique_indexes(db)
+
+
+@pytest.mark.anyio
+async def test_migration_keeps_the_latest_copy_of_each_product():
+    db = MemoryClient()["test"]
+    # The old PUT inserted each edit as a new document without updated_at.
+    await db["products"].insert_many(
+        [product("Rice", price=1), product("Beans"), product("Rice", price=2)]
+    )
+    await db["products"].insert_many(
+        [
+            product("Yam", price=5, updated_at=datetime(2024, 5, 1)),
+            product("Yam", price=4, updated_at=datetime(2024, 1, 1)),
+        ]
+    )
+    log = []
+
+    assert await move_duplicates(db, dry_run=True, log=log.append) == 2
+    assert await db["products"].count_documents({}) == 5
+    assert await move_duplicates(db, log=log.append) == 2
+
+    kept = await db["products"].find({}, {"_id": 0}).sort("name", 1).to_list(None)
+    assert [(doc["name"], doc.get("price")) for doc in kept] == [
+        ("Beans", None),
+        ("Rice", 2),
+        ("Yam", 5),
+    ]
+    moved = await db["products_duplicates"].find({}).to_list(None)
+    assert sorted(doc["price"] for doc in moved) == [1, 4]
+    assert all(str(doc["_id"]) in "".join(log) for doc in moved)
+    await database.ensure_unique_indexes(db)
+    with pytest.raises(DuplicateKeyError):
+        await db["products"].insert_one(product("Rice"))
+
+
+@pytest.mark.anyio
+async def test_unique_index_failure_is_raised():
+    db = MemoryClient()["test"]
+    await db["users"].insert_many([{"email": "a@example.com"} for _ in range(2)])
+
+    with pytest.raises(DuplicateKeyError):
+        await database.ensure_unique_indexes(db)
+
+
+def test_memory_backend_refuses_command_listeners(monkeypatch):
+    monkeypatch.setenv("DATABASE_BACKEND", "memory")
+    settings._resolve.cache_clear()
+    monkeypatch.setattr(database, "client", None)
+    monkeypatch.setattr(database, "event_listeners", [object()])
+    try:
+        with pytest.raises(RuntimeError):
+            database.connect()
+    finally:
+        settings._resolve.cache_clear()
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app.core.memory_db import MemoryClient
+from app.dispatch.services import (
+    RUNS_COLLECTION,
+    address_area,
+    claim_run,
+    pack_runs,
+    plan_runs,
+)
+
+
+def leg(order_id, load):
+    return {"order_id": order_id, "load": load}
+
+
+def test_address_area():
+    assert address_area("12 Allen Ave, Ikeja, Lagos") == "ikeja"
+    assert address_area("Yaba") == "yaba"
+    assert address_area(None) == "unknown"
+
+
+def test_pack_runs_first_fit_decreasing():
+    legs = [leg("a", 30), leg("b", 70), leg("c", 50), leg("d", 40), leg("e", 10)]
+    runs = pack_runs(legs, capacity=100, max_stops=15)
+    assert [run["order_ids"] for run in runs] == [["b", "a"], ["c", "d", "e"]]
+    assert [run["load"] for run in runs] == [100, 100]
+
+
+def test_pack_runs_limits_stops_and_isolates_oversized_legs():
+    runs = pack_runs([leg(i, 1) for i in range(5)], capacity=100, max_stops=2)
+    assert [len(run["order_ids"]) for run in runs] == [2, 2, 1]
+
+    runs = pack_runs([leg("big", 150), leg("small", 20)], capacity=100, max_stops=15)
+    assert [run["order_ids"] for run in runs] == [["big"], ["small"]]
+
+
+@pytest.fixture
+async def db():
+    db = MemoryClient()["test"]
+    seller, ikeja, yaba = ObjectId(), ObjectId(), ObjectId()
+    await db["users"].insert_many(
+        [
+            {"_id": seller, "address": "1 Market Rd, Apapa"},
+            {"_id": ikeja, "address": "12 Allen Ave, Ikeja, Lagos"},
+            {"_id": yaba, "address": "3 Herbert Macaulay Way, Yaba"},
+        ]
+    )
+
+    def order(buyer, quantity, status="confirmed"):
+        return {
+            "buyer_id": str(buyer),
+            "status": status,
+            "items": [{"seller_id": str(seller), "quantity": quantity}],
+            "version": 1,
+        }
+
+    await db["orders"].insert_many(
+        [
+            order(ikeja, 60),
+            order(ikeja, 30),
+            order(yaba, 20),
+            order(yaba, 5, status="pending"),
+        ]
+    )
+    return db
+
+
+@pytest.mark.anyio
+async def test_plan_runs_groups_by_seller_and_area(db):
+    runs = await plan_runs(db)
+    assert [(run["area"], run["load"]) for run in runs] == [("ikeja", 90), ("yaba", 20)]
+    assert all(run["pickup_address"] == "1 Market Rd, Apapa" for run in runs)
+    assert [run["area"] for run in await plan_runs(db, area="Yaba")] == ["yaba"]
+
+
+@pytest.mark.anyio
+async def test_concurrent_claims_of_one_run_have_one_winner(db):
+    run, _ = await plan_runs(db)
+    claims = await asyncio.gather(*(claim_run(db, run, f"d{i}") for i in range(3)))
+
+    (winner,) = [claim for claim in claims if claim]
+    assert winner["order_ids"] == run["order_ids"]
+    assert await db[RUNS_COLLECTION].count_documents({}) == 1
+    # Claimed legs aren't planned again.
+    assert [run["area"] for run in await plan_runs(db)] == ["yaba"]
+
+
+@pytest.mark.anyio
+async def test_partly_taken_run_shrinks_to_the_legs_won(db):
+    run, _ = await plan_runs(db)
+    taken = {**run, "order_ids": run["order_ids"][:1], "loads": run["loads"][:1]}
+    assert await claim_run(db, taken, "d1")
+
+    claimed = await claim_run(db, run, "d2")
+    assert claimed["order_ids"] == run["order_ids"][1:]
+    assert claimed["load"] == sum(run["loads"][1:])
+
+
+@pytest.mark.anyio
+async def test_failed_run_insert_releases_the_legs(db, monkeypatch):
+    run, _ = await plan_runs(db)
+
+    async def fail(document):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(db[RUNS_COLLECTION], "insert_one", fail)
+    with pytest.raises(RuntimeError):
+        await claim_run(db, run, "d1")
+    assert [run["load"] for run in await plan_runs(db)] == [90, 20]
@@ -0,0 +1,98 @@
+import pytest
+
+from app.core.memory_db import MemoryClient
+from app.products.facets import ProductFacets
+
+
+def product(category, status="available"):
+    return {"category": category, "status": status}
+
+
+@pytest.fixture
+async def db():
+    db = MemoryClient()["test"]
+    await db["products"].insert_many(
+        [product("grains"), product("grains", "unavailable"), product("tubers")]
+    )
+    return db
+
+
+@pytest.mark.anyio
+async def test_counts_are_cached_and_kept_current_by_writes(db):
+    facets = ProductFacets(ttl=60)
+    assert await facets.get(db) == {
+        "category": {"grains": 2, "tubers": 1},
+        "status": {"available": 2, "unavailable": 1},
+        "total": 3,
+    }
+
+    # Served from memory: a write that bypasses the hooks isn't seen ...
+    await db["products"].insert_one(product("fruits"))
+    assert (await facets.get(db))["total"] == 3
+
+    # ... while the write paths' hooks adjust the cached counts.
+    facets.added(product("fruits"))
+    facets.changed(product("tubers"), product("grains", "out of stock"))
+    facets.removed(product("grains", "unavailable"))
+    assert await facets.get(db) == {
+        "category": {"grains": 2, "fruits": 1},
+        "status": {"available": 2, "out of stock": 1},
+        "total": 3,
+    }
+
+
+@pytest.mark.anyio
+async def test_invalidate_and_ttl_reload(db):
+    facets = ProductFacets(ttl=60)
+    await facets.get(db)
+    await db["products"].insert_one(product("fruits"))
+    facets.invalidate()
+    assert (await facets.get(db))["total"] == 4
+
+    expiring = ProductFacets(ttl=0)
+    await expiring.get(db)
+    await db["products"].delete_many({"category": "fruits"})
+    assert (await expiring.get(db))["total"] == 3
+
+
+@pytest.mark.anyio
+async def test_load_racing_a_write_is_not_cached(db):
+    facets = ProductFacets(ttl=60)
+    load = facets.load
+
+    async def load_during_write(db):
+        counts = await load(db)
+        facets.added(product("fruits"))
+        await db["products"].insert_one(product("fruits"))
+        return counts
+
+    facets.load = load_during_write
+    assert (await facets.get(db))["total"] == 3
+    facets.load = load
+    assert (await facets.get(db))["total"] == 4
+
+
+def test_facets_endpoint_follows_product_writes(memory_client, seed_user):
+    seller_id, _, seller = seed_user("seller@example.com", "wholesaler")
+    assert memory_client.get("/api/v1/products/facets").json()["total"] == 0
+
+    response = memory_client.post(
+        "/api/v1/products",
+        json={
+            "name": "Rice",
+            "description": "bag",
+            "category": "grains",
+            "unit": "bag",
+            "price_per_unit": 100.0,
+            "stock_quantity": "10",
+            "seller_id": seller_id,
+        },
+        headers=seller,
+    )
+    product_id = response.json()["id"]
+    assert memory_client.get("/api/v1/products/facets").json()["category"] == {
+        "grains": 1
+    }
+
+    memory_client.delete(f"/api/v1/products/{product_id}", headers=seller)
+    assert memory_client.get("/api/v1/products/facets").json()["total"] == 0
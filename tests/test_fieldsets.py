@@ -0,0 +1,61 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core.fieldsets import parse_fields, select_fields, to_projection
+from app.products.services import product_images_stages
+
+ALLOWED = ["id", "name", "price_per_unit", "images"]
+
+
+def test_parse_fields_dedupes_and_keeps_order():
+    assert parse_fields(" name,id,,name ", ALLOWED) == ["name", "id"]
+    assert parse_fields(None, ALLOWED) is None
+    assert parse_fields("", ALLOWED) is None
+
+
+def test_parse_fields_rejects_unknown_fields():
+    with pytest.raises(HTTPException) as e:
+        parse_fields("name,password", ALLOWED)
+    assert e.value.status_code == 400
+    assert "password" in e.value.detail
+
+
+def test_projection_always_keeps_id():
+    assert to_projection(["id", "name"]) == {"_id": 1, "name": 1}
+    assert to_projection(None) is None
+
+
+def test_select_fields_drops_everything_else():
+    items = [{"id": "1", "name": "Rice", "version": 3, "updated_at": None}]
+    assert select_fields(items, ["name", "images"]) == [{"name": "Rice"}]
+    assert select_fields(items, None) is items
+
+
+def test_images_are_only_joined_when_requested():
+    assert [next(iter(s)) for s in product_images_stages(["name"])] == ["$project"]
+    assert [next(iter(s)) for s in product_images_stages(["images"])] == [
+        "$project",
+        "$lookup",
+    ]
+    assert [next(iter(s)) for s in product_images_stages()] == ["$lookup"]
+
+
+def test_product_list_fieldset(memory_client, seed_user):
+    seller_id, _, seller = seed_user("seller@example.com", "wholesaler")
+    product = {
+        "name": "Rice",
+        "description": "bag",
+        "category": "grains",
+        "unit": "bag",
+        "price_per_unit": 100.0,
+        "stock_quantity": "10",
+        "seller_id": seller_id,
+    }
+    memory_client.post("/api/v1/products", json=product, headers=seller)
+
+    response = memory_client.get("/api/v1/products", params={"fields": "name,id"})
+    assert response.status_code == 200, response.text
+    (item,) = response.json()["items"]
+    assert set(item) == {"name", "id"}
+    response = memory_client.get("/api/v1/products", params={"fields": "secret"})
+    assert response.status_code == 400
@@ -0,0 +1,114 @@
+import httpx
+import pytest
+
+from app.core import settings
+from app.core.http_client import CircuitOpenError, HttpClient, UpstreamError
+from app.core.uploads import upload_image
+
+
+def client_for(handler, **options):
+    options = {
+        "timeout": 1.0,
+        "max_connections": 10,
+        "max_connections_per_host": 5,
+        "retries": 2,
+        "backoff": 0,
+        **options,
+    }
+    return HttpClient(transport=httpx.MockTransport(handler), **options)
+
+
+def responding(*status_codes):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(status_codes[min(len(calls), len(status_codes)) - 1])
+
+    return handler, calls
+
+
+@pytest.mark.anyio
+async def test_idempotent_requests_are_retried():
+    handler, calls = responding(503, 503, 200)
+    response = await client_for(handler).get("https://api.example.com/x")
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+@pytest.mark.anyio
+async def test_posts_are_not_retried_once_sent():
+    handler, calls = responding(503, 200)
+    response = await client_for(handler).post("https://api.example.com/x")
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_posts_are_retried_when_the_connection_failed():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(201)
+
+    response = await client_for(handler).post("https://api.example.com/x")
+    assert response.status_code == 201
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_transport_errors_become_upstream_errors():
+    def handler(request):
+        raise httpx.ReadTimeout("slow", request=request)
+
+    with pytest.raises(UpstreamError) as e:
+        await client_for(handler).get("https://api.example.com/x")
+    assert e.value.status_code == 502
+
+
+@pytest.mark.anyio
+async def test_circuit_opens_after_consecutive_failures_and_half_opens():
+    handler, calls = responding(500)
+    http = client_for(handler, retries=0, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        await http.get("https://api.example.com/x")
+
+    with pytest.raises(CircuitOpenError):
+        await http.get("https://api.example.com/x")
+    assert len(calls) == 2
+    # Other hosts have their own breaker.
+    await http.get("https://other.example.com/x")
+
+    breaker = http.breaker("api.example.com")
+    breaker.opened_at -= 60
+    await http.get("https://api.example.com/x")
+    assert len(calls) == 4
+    with pytest.raises(CircuitOpenError):
+        await http.get("https://api.example.com/x")
+
+
+class UploadedFile:
+    filename = "photo.png"
+    content_type = "image/png"
+
+    async def read(self):
+        return b"image"
+
+
+@pytest.mark.anyio
+async def test_upload_error_response_is_an_upstream_error(monkeypatch):
+    for name in ("CLOUD_NAME", "CLOUDINARY_API_KEY", "CLOUDINARY_API_SECRET"):
+        monkeypatch.setenv(name, "test")
+    settings._resolve.cache_clear()
+    handler, calls = responding(500)
+    try:
+        with pytest.raises(UpstreamError) as e:
+            await upload_image(client_for(handler), UploadedFile(), "photo")
+    finally:
+        settings._resolve.cache_clear()
+    assert e.value.status_code == 502
+    assert "HTTP 500" in e.value.detail
+    assert len(calls) == 1
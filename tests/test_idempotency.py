@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.idempotency import COLLECTION, run_idempotent
+from app.core.memory_db import MemoryClient
+
+
+@pytest.fixture
+def db():
+    return MemoryClient()["test"]
+
+
+def counting(result):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return result
+
+    return compute, calls
+
+
+@pytest.mark.anyio
+async def test_retry_is_replayed(db):
+    compute, calls = counting({"id": "1"})
+    assert await run_idempotent("k", "orders", "fp", compute, db) == {"id": "1"}
+
+    response = await run_idempotent("k", "orders", "fp", compute, db)
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert response.body == b'{"id":"1"}'
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_concurrent_duplicates_share_one_call(db):
+    compute, calls = counting({"id": "1"})
+    first, second = await asyncio.gather(
+        run_idempotent("k", "orders", "fp", compute, db),
+        run_idempotent("k", "orders", "fp", compute, db),
+    )
+    assert first == {"id": "1"}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_key_reused_with_different_payload_is_rejected(db):
+    compute, _ = counting({"id": "1"})
+    await run_idempotent("k", "orders", "fp", compute, db)
+
+    with pytest.raises(HTTPException) as e:
+        await run_idempotent("k", "orders", "other", compute, db)
+    assert e.value.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_failed_request_releases_key(db):
+    async def fail():
+        raise HTTPException(status_code=400)
+
+    with pytest.raises(HTTPException):
+        await run_idempotent("k", "orders", "fp", fail, db)
+    compute, calls = counting({"id": "1"})
+    assert await run_idempotent("k", "orders", "fp", compute, db) == {"id": "1"}
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_cancelled_request_releases_key(db):
+    started = asyncio.Event()
+
+    async def hang():
+        started.set()
+        await asyncio.sleep(60)
+
+    original = asyncio.create_task(run_idempotent("k", "orders", "fp", hang, db))
+    await started.wait()
+    compute, calls = counting({"id": "1"})
+    waiter = asyncio.create_task(run_idempotent("k", "orders", "fp", compute, db))
+    await asyncio.sleep(0)
+    original.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await original
+    # The duplicate that was waiting runs the request itself.
+    assert await waiter == {"id": "1"}
+    assert len(calls) == 1
+    assert (await db[COLLECTION].find_one({"_id": "orders:k"}))["state"] == "completed"
+
+    await db[COLLECTION].delete_many({})
+    original = asyncio.create_task(run_idempotent("k", "orders", "fp", hang, db))
+    await asyncio.sleep(0)
+    original.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await original
+    assert await db[COLLECTION].find_one({"_id": "orders:k"}) is None
+    assert await run_idempotent("k", "orders", "fp", compute, db) == {"id": "1"}
@@ -0,0 +1,159 @@
+import pytest
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.core.auth import AuthHandler
+from app.core.memory_db import MemoryClient
+
+
+def test_order_flow_runs_in_memory(memory_client, seed_user):
+    client = memory_client
+    lagos = {"type": "Point", "coordinates": [3.39, 6.45]}
+    seller_id, refresh_token, seller_headers = seed_user(
+        "seller@example.com", "wholesaler", lagos
+    )
+    _, _, buyer_headers = seed_user("buyer@example.com", "retailer")
+
+    refresh = {"refresh_token": refresh_token}
+    response = client.post("/api/v1/auth/users/refresh", json=refresh)
+    assert response.status_code == 200, response.text
+    response = client.post("/api/v1/auth/users/refresh", json=refresh)
+    assert response.status_code == 401
+
+    product = {
+        "name": "Rice",
+        "description": "50kg bag",
+        "category": "grains",
+        "unit": "bag",
+        "price_per_unit": 100.0,
+        "stock_quantity": "10",
+        "seller_id": seller_id,
+    }
+    response = client.post("/api/v1/products", json=product, headers=seller_headers)
+    assert response.status_code == 200, response.text
+    product_id = response.json()["id"]
+
+    response = client.get("/api/v1/products", params={"category": "grains"})
+    assert [p["id"] for p in response.json()["items"]] == [product_id]
+    response = client.get("/api/v1/products", params={"near": "6.46,3.40"})
+    assert [p["id"] for p in response.json()["items"]] == [product_id]
+    response = client.get("/api/v1/products/facets")
+    assert response.json()["category"] == {"grains": 1}
+
+    items = [{"product_id": product_id, "quantity": 1}]
+    response = client.post(
+        "/api/v1/orders/", json={"items": items}, headers=buyer_headers
+    )
+    assert response.status_code == 200, response.text
+    order_id = response.json()[0]["order_id"]
+
+    status = {"status": "confirmed", "version": 1}
+    url = f"/api/v1/orders/{order_id}/status"
+    response = client.patch(url, json=status, headers=seller_headers)
+    assert response.status_code == 200, response.text
+    response = client.patch(url, json=status, headers=seller_headers)
+    assert response.status_code == 409, response.text
+
+
+@pytest.mark.anyio
+async def test_query_and_update_operators():
+    orders = MemoryClient()["test"]["orders"]
+    await orders.create_index([("ref", 1)], unique=True)
+    await orders.insert_many(
+        [
+            {"ref": 1, "status": "pending", "items": [{"seller_id": "a"}]},
+            {"ref": 2, "status": "confirmed", "items": [{"seller_id": "b"}]},
+            {"ref": 3, "status": "pending", "items": [{"seller_id": "b"}]},
+        ]
+    )
+
+    query = {"items.seller_id": "b", "$or": [{"status": {"$in": ["pending"]}}]}
+    assert [o["ref"] async for o in orders.find(query)] == [3]
+    cursor = orders.find({}, {"ref": 1, "_id": 0}).sort("ref", -1).limit(2)
+    assert await cursor.to_list(length=None) == [{"ref": 3}, {"ref": 2}]
+
+    updated = await orders.find_one_and_update(
+        {"ref": 1, "status": "pending"},
+        {"$set": {"status": "cancelled"}, "$push": {"history": "cancelled"}},
+        return_document=ReturnDocument.AFTER,
+    )
+    assert updated["status"] == "cancelled" and updated["history"] == ["cancelled"]
+    result = await orders.bulk_write(
+        [
+            UpdateOne({"ref": 2}, {"$inc": {"version": 1}}),
+            UpdateOne({"ref": 9}, {"$inc": {"version": 1}}),
+        ]
+    )
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    with pytest.raises(DuplicateKeyError):
+        await orders.update_one({"ref": 2}, {"$set": {"ref": 3}})
+
+    pipeline = [
+        {"$match": {"ref": {"$gte": 2}}},
+        {
+            "$lookup": {
+                "from": "sellers",
+                "localField": "items.seller_id",
+                "foreignField": "_id",
+                "as": "sellers",
+            }
+        },
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+    counts = await orders.aggregate(pipeline).to_list(length=None)
+    assert counts == [{"_id": "confirmed", "count": 1}, {"_id": "pending", "count": 1}]
+
+
+def test_duplicate_signup_is_rejected_before_hashing(
+    memory_client, seed_user, monkeypatch
+):
+    seed_user("taken@example.com", "retailer")
+
+    def hash_password(self, password):
+        raise AssertionError("password hashed for a duplicate signup")
+
+    monkeypatch.setattr(AuthHandler, "get_password_hash", hash_password)
+    response = memory_client.post(
+        "/api/v1/auth/users/register",
+        json={
+            "email": "taken@example.com",
+            "password": "password123",
+            "first_name": "Test",
+            "middle_name": None,
+            "last_name": "User",
+            "phone": None,
+            "address": None,
+            "role": "retailer",
+        },
+    )
+    assert response.status_code == 400, response.text
+
+
+@pytest.mark.anyio
+async def test_rejects_what_mongodb_rejects():
+    db = MemoryClient()["test"]
+    await db["orders"].insert_one({"ref": 1})
+
+    with pytest.raises(ValueError):
+        await db["orders"].update_one({"ref": 1}, {})
+    with pytest.raises(ValueError):
+        await db["orders"].update_one({"ref": 1}, {"ref": 2})
+    with pytest.raises(ValueError):
+        await db["orders"].replace_one({"ref": 1}, {"$set": {"ref": 2}})
+    with pytest.raises(ValueError):
+        await db["orders"].bulk_write(
+            [UpdateOne({"ref": 1}, {"$set": {"ref": 2}}), UpdateOne({"ref": 1}, {})]
+        )
+    # Validated up front: the first operation wasn't applied either.
+    assert await db["orders"].find_one({"ref": 1})
+
+    near = {"near": {"type": "Point", "coordinates": [0, 0]}, "distanceField": "d"}
+    for pipeline in (
+        [{"$match": {}}, {"$geoNear": near}],
+        [{"$facet": {"near": [{"$geoNear": near}]}}],
+    ):
+        with pytest.raises(OperationFailure):
+            await db["orders"].aggregate(pipeline).to_list(length=None)
+    with pytest.raises(OperationFailure):
+        await db.command({"explain": {"find": "orders"}})
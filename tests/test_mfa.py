@@ -0,0 +1,63 @@
+import pytest
+from bson import ObjectId
+
+from app.accounts import services
+from app.accounts.services import disable_user_mfa, mfa_qrcode_image
+from app.core.memory_db import MemoryClient
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+
+    def render(secret, email, image_format="png"):
+        calls.append(secret)
+        return f"{secret}:{image_format}".encode()
+
+    monkeypatch.setattr(services, "render_mfa_qrcode", render)
+    monkeypatch.setattr(services, "_mfa_qrcodes", {})
+    return calls
+
+
+@pytest.mark.anyio
+async def test_qrcode_is_kept_until_the_secret_changes(renders):
+    user = {"_id": ObjectId(), "email": "a@example.com", "mfa_secret": "ONE"}
+    assert await mfa_qrcode_image(user) == b"ONE:png"
+    assert await mfa_qrcode_image(user) == b"ONE:png"
+    assert await mfa_qrcode_image(user, "svg") == b"ONE:svg"
+    assert renders == ["ONE", "ONE"]
+
+    user["mfa_secret"] = "TWO"
+    assert await mfa_qrcode_image(user) == b"TWO:png"
+    # The old secret's images are replaced, not kept alongside the new one.
+    assert services._mfa_qrcodes[(str(user["_id"]), "png")][0][0] == "TWO"
+    assert len(services._mfa_qrcodes) == 2
+
+
+@pytest.mark.anyio
+async def test_disabling_mfa_evicts_the_qrcode(renders):
+    db = MemoryClient()["test"]
+    user = {
+        "_id": ObjectId(),
+        "email": "a@example.com",
+        "mfa_secret": "ONE",
+        "mfa_enabled": True,
+    }
+    await db["users"].insert_one(dict(user))
+    await mfa_qrcode_image(user)
+    await mfa_qrcode_image(user, "svg")
+
+    await disable_user_mfa(user, db)
+    assert services._mfa_qrcodes == {}
+
+
+@pytest.mark.anyio
+async def test_cache_is_bounded(renders, monkeypatch):
+    monkeypatch.setattr(services, "MFA_QRCODE_CACHE_SIZE", 2)
+    users = [
+        {"_id": ObjectId(), "email": "a@example.com", "mfa_secret": f"S{i}"}
+        for i in range(3)
+    ]
+    for user in users:
+        await mfa_qrcode_image(user)
+    assert list(services._mfa_qrcodes) == [(str(u["_id"]), "png") for u in users[1:]]
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import database, settings
+from app.core.query_audit import QueryAuditor
+from app.main import app
+
+MONGO_TEST_URL = os.environ.get("MONGO_TEST_URL")
+PASSWORD = "password123"
+
+pytestmark = pytest.mark.skipif(
+    not MONGO_TEST_URL, reason="set MONGO_TEST_URL to run against a local mongod"
+)
+
+
+@pytest.fixture
+def audited_client(monkeypatch):
+    monkeypatch.setenv("MONGO_DB_URL", MONGO_TEST_URL)
+    monkeypatch.setenv("MONGO_DB_NAME", "foodnest_query_audit")
+    settings._resolve.cache_clear()
+    auditor = QueryAuditor()
+    monkeypatch.setattr(database, "event_listeners", [auditor.listener])
+
+    with TestClient(app) as client:
+        client.portal.call(database.db.client.drop_database, database.db.name)
+        client.portal.call(database.ensure_indexes, database.db)
+        yield client, auditor
+        client.portal.call(database.db.client.drop_database, database.db.name)
+    settings._resolve.cache_clear()
+
+
+def register(client, email, role):
+    response = client.post(
+        "/api/v1/auth/users/register",
+        json={
+            "email": email,
+            "password": PASSWORD,
+            "first_name": "Test",
+            "middle_name": None,
+            "last_name": "User",
+            "phone": None,
+            "address": None,
+            "role": role,
+        },
+    )
+    assert response.status_code == 201, response.text
+    body = response.json()
+    return body["id"], {"Authorization": f"Bearer {body['access_token']}"}
+
+
+def test_app_queries_use_indexes(audited_client):
+    client, auditor = audited_client
+    admin_id, admin = register(client, "admin@example.com", "admin")
+    seller_id, seller = register(client, "seller@example.com", "wholesaler")
+    buyer_id, buyer = register(client, "buyer@example.com", "retailer")
+    client.post(
+        "/api/v1/auth/users/login",
+        json={"email": "buyer@example.com", "password": PASSWORD},
+    )
+
+    product = {
+        "name": "Rice",
+        "description": "50kg bag",
+        "category": "grains",
+        "unit": "bag",
+        "price_per_unit": 100.0,
+        "stock_quantity": "10",
+        "seller_id": seller_id,
+    }
+    response = client.post("/api/v1/products", json=product, headers=seller)
+    assert response.status_code == 200, response.text
+    product_id = response.json()["id"]
+
+    response = client.patch(
+        f"/api/v1/products/{product_id}", json={"price_per_unit": 120.0}, headers=seller
+    )
+    assert response.status_code == 200, response.text
+    client.get(f"/api/v1/products/{product_id}")
+    client.get(f"/api/v1/products/{product_id}", headers={"If-None-Match": '"x"'})
+    client.get("/api/v1/products")
+    client.get("/api/v1/products", params={"status": "available"})
+    client.get("/api/v1/products", params={"category": "grains"})
+    client.get("/api/v1/products", params={"near": "6.45,3.39", "radius": 5000})
+    client.get("/api/v1/products", headers={"If-None-Match": '"x"'})
+    client.get("/api/v1/products", params={"ids": product_id, "fields": "name"})
+
+    items = [{"product_id": product_id, "quantity": 1}]
+    response = client.post("/api/v1/orders/", json={"items": items}, headers=buyer)
+    assert response.status_code == 200, response.text
+    order_id = response.json()[0]["order_id"]
+    response = client.patch(
+        f"/api/v1/orders/{order_id}/status",
+        json={"status": "confirmed", "version": 1},
+        headers=seller,
+    )
+    assert response.status_code == 200, response.text
+
+    for headers in (admin, seller, buyer):
+        client.get("/api/v1/orders/", headers=headers)
+        client.get("/api/v1/orders/", params={"status": "pending"}, headers=headers)
+    client.get(f"/api/v1/orders/{order_id}", headers=buyer)
+    client.get(f"/api/v1/auth/users/{buyer_id}", headers=buyer)
+    client.post("/api/v1/auth/users/batch", json={"ids": [seller_id]}, headers=admin)
+    client.get("/api/v1/products/facets")
+    response = client.delete(f"/api/v1/products/{product_id}", headers=seller)
+    assert response.status_code == 204, response.text
+
+    issues = client.portal.call(auditor.audit, database.db)
+    assert auditor.shapes
+    assert not issues, "\n".join(str(issue) for issue in issues)
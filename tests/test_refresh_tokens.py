@@ -0,0 +1,35 @@
+from app.accounts.services import REFRESH_TOKENS_COLLECTION
+from app.core import database
+
+URL = "/api/v1/auth/users/refresh"
+
+
+def stored_tokens(client):
+    tokens = database.db[REFRESH_TOKENS_COLLECTION]
+    return client.portal.call(tokens.count_documents, {})
+
+
+def test_issuing_a_token_writes_nothing(memory_client, seed_user):
+    seed_user("buyer@example.com", "retailer")
+    assert stored_tokens(memory_client) == 0
+
+
+def test_reusing_a_token_revokes_its_family(memory_client, seed_user):
+    _, first, _ = seed_user("buyer@example.com", "retailer")
+    response = memory_client.post(URL, json={"refresh_token": first})
+    assert response.status_code == 200, response.text
+    second = response.json()["refresh_token"]
+
+    # The stolen copy of the first token is presented again ...
+    assert memory_client.post(URL, json={"refresh_token": first}).status_code == 401
+    # ... so the token the legitimate client rotated to is revoked too.
+    assert memory_client.post(URL, json={"refresh_token": second}).status_code == 401
+
+
+def test_other_logins_are_unaffected_by_a_revoked_family(memory_client, seed_user):
+    _, stolen, _ = seed_user("buyer@example.com", "retailer")
+    memory_client.post(URL, json={"refresh_token": stolen})
+    memory_client.post(URL, json={"refresh_token": stolen})
+
+    _, other, _ = seed_user("seller@example.com", "wholesaler")
+    assert memory_client.post(URL, json={"refresh_token": other}).status_code == 200
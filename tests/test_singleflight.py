@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+def slow_call(result, release):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return call, calls
+
+
+@pytest.mark.anyio
+async def test_concurrent_identical_calls_share_one_execution():
+    flight, release = SingleFlight(), asyncio.Event()
+    call, calls = slow_call({"id": 1}, release)
+    waiters = [asyncio.create_task(flight.do("get", "a", call)) for _ in range(3)]
+    other = asyncio.create_task(flight.do("get", "b", call))
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(*waiters)
+    assert results == [{"id": 1}] * 3
+    assert results[0] is results[1]
+    assert await other == {"id": 1}
+    assert len(calls) == 2
+    assert flight.stats() == {"get": {"executed": 2, "coalesced": 2}}
+
+
+@pytest.mark.anyio
+async def test_nothing_is_kept_after_the_call_finishes():
+    flight, release = SingleFlight(), asyncio.Event()
+    release.set()
+    call, calls = slow_call(1, release)
+    await flight.do("get", "a", call)
+    await flight.do("get", "a", call)
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_errors_reach_every_waiter_and_clear_the_key():
+    flight, release = SingleFlight(), asyncio.Event()
+    call, calls = slow_call(RuntimeError("down"), release)
+    waiters = [asyncio.create_task(flight.do("get", "a", call)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+
+    for waiter in waiters:
+        with pytest.raises(RuntimeError):
+            await waiter
+    assert not flight._calls
+
+
+@pytest.mark.anyio
+async def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flight, release = SingleFlight(), asyncio.Event()
+    call, calls = slow_call("ok", release)
+    first = asyncio.create_task(flight.do("get", "a", call))
+    second = asyncio.create_task(flight.do("get", "a", call))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    release.set()
+    assert await second == "ok"
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_call_outlives_all_its_callers():
+    flight, release = SingleFlight(), asyncio.Event()
+    call, calls = slow_call("ok", release)
+    first = asyncio.create_task(flight.do("get", "a", call))
+    await asyncio.sleep(0)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    # Still in flight, so a new caller joins it instead of starting another.
+    late = asyncio.create_task(flight.do("get", "a", call))
+    await asyncio.sleep(0)
+    release.set()
+    assert await late == "ok"
+    assert len(calls) == 1
+    assert not flight._calls
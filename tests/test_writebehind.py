@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from app.core import writebehind
+from app.core.memory_db import MemoryClient
+from app.core.writebehind import WriteBehindBuffer
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = MemoryClient()["test"]
+    monkeypatch.setattr(writebehind, "get_database", lambda: db)
+    return db
+
+
+async def users(db):
+    return await db["users"].find({}).sort("_id", 1).to_list(length=None)
+
+
+@pytest.mark.anyio
+async def test_updates_to_one_document_are_merged(db):
+    await db["users"].insert_many([{"_id": 1}, {"_id": 2}])
+    buffer = WriteBehindBuffer(max_entries=10, interval=60)
+    buffer.record("users", 1, {"last_login": "a"})
+    buffer.record("users", 1, {"last_login": "b", "seen": True})
+    buffer.record("users", 2, {"last_login": "c"})
+    assert len(buffer) == 2
+
+    await buffer.flush()
+    assert len(buffer) == 0
+    assert await users(db) == [
+        {"_id": 1, "last_login": "b", "seen": True},
+        {"_id": 2, "last_login": "c"},
+    ]
+
+
+@pytest.mark.anyio
+async def test_reaching_max_entries_flushes(db):
+    await db["users"].insert_many([{"_id": 1}, {"_id": 2}])
+    buffer = WriteBehindBuffer(max_entries=2, interval=60)
+    buffer.record("users", 1, {"last_login": "a"})
+    await asyncio.sleep(0)
+    assert len(buffer) == 1
+
+    buffer.record("users", 2, {"last_login": "b"})
+    await buffer._flushing
+    assert len(buffer) == 0
+    assert [user["last_login"] for user in await users(db)] == ["a", "b"]
+
+
+@pytest.mark.anyio
+async def test_flushes_periodically_and_on_stop(db):
+    await db["users"].insert_many([{"_id": 1}, {"_id": 2}])
+    buffer = WriteBehindBuffer(max_entries=10, interval=0.01)
+    buffer.start()
+    buffer.record("users", 1, {"last_login": "a"})
+    await asyncio.sleep(0.05)
+    assert (await db["users"].find_one({"_id": 1}))["last_login"] == "a"
+
+    buffer.record("users", 2, {"last_login": "b"})
+    await buffer.stop()
+    assert (await db["users"].find_one({"_id": 2}))["last_login"] == "b"
+    assert buffer._task is None
+
+
+@pytest.mark.anyio
+async def test_failed_flush_drops_the_batch(db, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise RuntimeError("unavailable")
+
+    monkeypatch.setattr(db["users"], "bulk_write", fail)
+    buffer = WriteBehindBuffer(max_entries=10, interval=60)
+    buffer.record("users", 1, {"last_login": "a"})
+    await buffer.flush()
+    assert len(buffer) == 0
+
+
+@pytest.mark.anyio
+async def test_stop_waits_for_an_in_progress_flush(db, monkeypatch):
+    await db["users"].insert_many([{"_id": 1}])
+    bulk_write = db["users"].bulk_write
+    started = asyncio.Event()
+
+    async def slow(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(0.05)
+        return await bulk_write(*args, **kwargs)
+
+    monkeypatch.setattr(db["users"], "bulk_write", slow)
+    buffer = WriteBehindBuffer(max_entries=10, interval=0.01)
+    buffer.start()
+    buffer.record("users", 1, {"last_login": "a"})
+    await started.wait()
+
+    await buffer.stop()
+    assert (await db["users"].find_one({"_id": 1}))["last_login"] == "a"
+
+
+@pytest.mark.anyio
+async def test_cancelled_flush_puts_the_batch_back(db, monkeypatch):
+    started = asyncio.Event()
+
+    async def hang(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(db["users"], "bulk_write", hang)
+    buffer = WriteBehindBuffer(max_entries=10, interval=60)
+    buffer.record("users", 1, {"last_login": "a", "seen": True})
+    flushing = asyncio.get_running_loop().create_task(buffer.flush())
+    await started.wait()
+    buffer.record("users", 1, {"last_login": "b"})
+
+    flushing.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await flushing
+    assert buffer._pending[("users", 1)] == {"last_login": "b", "seen": True}